@@ -1,16 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask
 from config import Config
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
+from app.song_cache import SongCache
+from app.audiodb import AudioDBClient, AsyncAudioDBClient
+from app.broadcast import Broadcaster
+from app.assets import load_manifest, PrecompressedStatic
+from app.metrics import Metrics
+from app.engine_profiles import engine_options, configure_engine
 
 
 app = Flask(__name__)
 app.config.from_object(Config)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
 db = SQLAlchemy(app)
+with app.app_context():
+    configure_engine(db.engine, app.config)
 migrate = Migrate(app, db)
 login = LoginManager (app)
 login.login_view = 'login'
+metrics = Metrics()
+background = ThreadPoolExecutor(max_workers=2, thread_name_prefix='background') # for work that shouldn't hold up a request
+song_cache = SongCache(app.config['SONG_CACHE_PATH'], max_entries=app.config['SONG_CACHE_SIZE'],
+                       ttl=app.config['SONG_CACHE_TTL'], negative_ttl=app.config['SONG_CACHE_NEGATIVE_TTL'],
+                       stale_ttl=app.config['SONG_CACHE_STALE_TTL'], executor=background, app=app)
+audiodb = AudioDBClient(app.config['AUDIODB_URL'], app.config['AUDIODB_API_KEY'],
+                        connect_timeout=app.config['AUDIODB_CONNECT_TIMEOUT'],
+                        read_timeout=app.config['AUDIODB_READ_TIMEOUT'], retries=app.config['AUDIODB_RETRIES'],
+                        backoff=app.config['AUDIODB_BACKOFF'], pool_size=app.config['AUDIODB_POOL_SIZE'],
+                        observer=metrics.observe_api)
+audiodb_async = AsyncAudioDBClient(app.config['AUDIODB_URL'], app.config['AUDIODB_API_KEY'],
+                                   connect_timeout=app.config['AUDIODB_CONNECT_TIMEOUT'],
+                                   read_timeout=app.config['AUDIODB_READ_TIMEOUT'],
+                                   retries=app.config['AUDIODB_RETRIES'], backoff=app.config['AUDIODB_BACKOFF'],
+                                   pool_size=app.config['AUDIODB_POOL_SIZE'], observer=metrics.observe_api)
+broadcaster = Broadcaster()
+asset_manifest = load_manifest(app.config['ASSET_MANIFEST']) # empty until the static files are built
+app.wsgi_app = PrecompressedStatic(app.wsgi_app, app.static_folder, app.static_url_path, app.config['ASSET_CACHE_SECONDS'])
 
 
-from app import routes, models
+from app import routes, models, identity, cli
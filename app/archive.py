@@ -0,0 +1,85 @@
+import json
+from sqlalchemy.orm import selectinload
+from app import db
+from app.models import Events, EventUsers, User, VotedSongs
+from app.models import ArchivedEvent, ArchivedEventMember, ArchivedEventVote
+
+
+def archive_event(event_id): # copies an events members and votes into the archive, inside the callers transaction
+    event = db.session.get(Events, event_id)
+    archived = ArchivedEvent(event_id=event.event_id, owner_id=event.user_id,
+                             event_name=event.event_name, event_code=event.event_code)
+    db.session.add(archived)
+    db.session.flush() # gives the archived event its id
+
+    # copies the rows with INSERT ... SELECT so nothing is loaded into python
+    archive_id = db.literal(archived.archive_id)
+    members = db.select(archive_id, EventUsers.user_id, User.username, EventUsers.is_admin, EventUsers.is_dj) \
+        .join(User, User.user_id == EventUsers.user_id) \
+        .where(EventUsers.event_id == event_id) \
+        .order_by(EventUsers.event_user_id)
+    db.session.execute(db.insert(ArchivedEventMember).from_select(
+        ['archive_id', 'user_id', 'username', 'is_admin', 'is_dj'], members))
+
+    votes = db.select(archive_id, VotedSongs.user_id, VotedSongs.track_id, VotedSongs.song_name, VotedSongs.artist_name) \
+        .where(VotedSongs.event_id == event_id) \
+        .order_by(VotedSongs.vote_id)
+    db.session.execute(db.insert(ArchivedEventVote).from_select(
+        ['archive_id', 'user_id', 'track_id', 'song_name', 'artist_name'], votes))
+
+    return archived
+
+
+# archive ids go up in the order events end, so ordering by them reads the indexes in order instead of sorting
+
+def event_history_query(event_id, owner_id):
+    return ArchivedEvent.query.filter_by(event_id=event_id, owner_id=owner_id) \
+        .order_by(ArchivedEvent.archive_id)
+
+
+def event_history(event_id, owner_id): # gets every past run of an event, with its members and votes
+    return event_history_query(event_id, owner_id) \
+        .options(selectinload(ArchivedEvent.members), selectinload(ArchivedEvent.votes)) \
+        .all()
+
+
+def user_history_query(user_id, limit=None):
+    history = ArchivedEvent.query \
+        .join(ArchivedEventMember, ArchivedEventMember.archive_id == ArchivedEvent.archive_id) \
+        .filter(ArchivedEventMember.user_id == user_id) \
+        .order_by(ArchivedEventMember.archive_id.desc())
+    if limit:
+        history = history.limit(limit)
+    return history
+
+
+def user_history(user_id, limit=None): # gets the past events a user was in, most recent first
+    return user_history_query(user_id, limit).all()
+
+
+def export_text(archives): # writes the history in the same layout as the old history files
+    lines = []
+    for archived in archives:
+        lines.append('Event History for ' + archived.event_name + '\n \n')
+        lines.append('Date: ' + str(archived.ended_at) + '\n \n')
+        lines.append('All Users' + '\n' + '---' + '\n')
+        for member in archived.members:
+            lines.append(member.username + '\n')
+        lines.append('\nAll Songs' + '\n' + '---' + '\n')
+        for vote in archived.votes:
+            lines.append(vote.song_name + ' by ' + vote.artist_name + '\n')
+        lines.append('\n \n')
+    return ''.join(lines)
+
+
+def export_json(archives): # writes the history as json
+    return json.dumps([{
+        'event_id': archived.event_id,
+        'event_name': archived.event_name,
+        'event_code': archived.event_code,
+        'ended_at': archived.ended_at.isoformat() if archived.ended_at else None,
+        'members': [{'user_id': member.user_id, 'username': member.username,
+                     'is_admin': bool(member.is_admin), 'is_dj': bool(member.is_dj)} for member in archived.members],
+        'votes': [{'user_id': vote.user_id, 'track_id': vote.track_id, 'song_name': vote.song_name,
+                   'artist_name': vote.artist_name} for vote in archived.votes],
+    } for archived in archives], indent=2)
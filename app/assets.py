@@ -0,0 +1,182 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+from werkzeug.http import parse_accept_header
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+
+
+ASSET_FOLDERS = ('css', 'fonts', 'images') # uploads and history are user content, not part of the build
+BUILD_FOLDER = 'dist'
+COMPRESSIBLE = ('.css', '.js', '.svg', '.ttf', '.json', '.txt') # images and woff2 are already compressed
+FONT_UNICODES = 'U+0020-007E,U+00A0-00FF,U+2018-201F,U+2026' # latin, smart quotes and the ellipsis
+CSS_URL = re.compile(r'''url\((['"]?)([^'")]+)\1\)(\s*format\((['"]?)[^)]*\4\))?''')
+
+
+def load_manifest(path): # the source path -> built path map, empty when the assets haven't been built
+    try:
+        with open(path) as manifest:
+            return json.load(manifest)
+    except FileNotFoundError:
+        return {}
+
+
+def fingerprinted(name, data): # adds a hash of the contents to a file name, so it can be cached forever
+    stem, extension = os.path.splitext(name)
+    return f'{stem}.{hashlib.sha256(data).hexdigest()[:10]}{extension}'
+
+
+def write_asset(out, manifest, name, data): # writes one built file and records it in the manifest
+    built = os.path.join(BUILD_FOLDER, fingerprinted(name, data)).replace(os.sep, '/')
+    path = os.path.join(out, os.path.relpath(built, BUILD_FOLDER))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as asset:
+        asset.write(data)
+    manifest[name] = built
+
+
+def font_to_woff2(path): # subsets a font to the characters the site uses and packs it as woff2
+    try:
+        from fontTools import subset
+    except ImportError: # fonttools and brotli are only needed when building
+        return None
+    options = subset.Options()
+    options.flavor = 'woff2'
+    options.layout_features = ['*']
+    font = subset.load_font(path, options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=subset.parse_unicodes(FONT_UNICODES))
+    subsetter.subset(font)
+    temp_path = path + '.woff2.part'
+    try:
+        subset.save_font(font, temp_path, options)
+        with open(temp_path, 'rb') as woff2:
+            return woff2.read()
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def rewrite_css(css, name, manifest): # points the url()s in a stylesheet at the built files
+    folder = os.path.dirname(name)
+    built_folder = os.path.dirname(os.path.join(BUILD_FOLDER, name))
+
+    def built_url(source):
+        return os.path.relpath(manifest[source], built_folder).replace(os.sep, '/')
+
+    def replace(match):
+        url = match.group(2)
+        if url.startswith(('data:', 'http:', 'https:', '//', '#')):
+            return match.group(0)
+        if url.startswith('/static/'):
+            source = url[len('/static/'):]
+        else:
+            source = os.path.normpath(os.path.join(folder, url)).replace(os.sep, '/')
+        if source not in manifest:
+            return match.group(0)
+        woff2 = os.path.splitext(source)[0] + '.woff2'
+        if source.endswith('.ttf') and woff2 in manifest: # browsers that can't read woff2 fall back to the ttf
+            return f"url('{built_url(woff2)}') format('woff2'), url('{built_url(source)}') format('truetype')"
+        return f"url('{built_url(source)}'){match.group(3) or ''}"
+
+    return CSS_URL.sub(replace, css)
+
+
+def precompress(path): # writes .br and .gz copies next to a built file when they are smaller
+    with open(path, 'rb') as asset:
+        data = asset.read()
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    try:
+        import brotli
+        variants.append(('.br', brotli.compress(data, quality=11)))
+    except ImportError: # gzip only without the brotli package
+        pass
+    written = []
+    for suffix, compressed in variants:
+        if len(compressed) < len(data):
+            with open(path + suffix, 'wb') as variant:
+                variant.write(compressed)
+            written.append(suffix)
+    return written
+
+
+def build(static_folder, log=print): # fingerprints, converts and precompresses the static files into dist/
+    out = os.path.join(static_folder, BUILD_FOLDER)
+    if os.path.exists(out):
+        shutil.rmtree(out)
+    os.makedirs(out)
+
+    sources = []
+    for folder in ASSET_FOLDERS:
+        for root, _, files in os.walk(os.path.join(static_folder, folder)):
+            for file_name in sorted(files):
+                sources.append(os.path.relpath(os.path.join(root, file_name), static_folder).replace(os.sep, '/'))
+
+    manifest = {}
+    stylesheets = []
+    for name in sources:
+        path = os.path.join(static_folder, name)
+        if name.endswith('.css'): # rewritten last, once everything they point at has a built name
+            stylesheets.append(name)
+            continue
+        with open(path, 'rb') as source:
+            write_asset(out, manifest, name, source.read())
+
+        if name.endswith('.ttf'):
+            woff2 = font_to_woff2(path)
+            if woff2 is None:
+                log(f'{name}: install fonttools and brotli to build a woff2 copy')
+            else:
+                write_asset(out, manifest, os.path.splitext(name)[0] + '.woff2', woff2)
+
+    for name in stylesheets:
+        with open(os.path.join(static_folder, name)) as source:
+            css = rewrite_css(source.read(), name, manifest)
+        write_asset(out, manifest, name, css.encode())
+
+    for name, built in manifest.items():
+        if built.endswith(COMPRESSIBLE):
+            precompress(os.path.join(static_folder, built))
+
+    with open(os.path.join(out, 'manifest.json'), 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    return manifest
+
+
+class PrecompressedStatic: # wsgi middleware that serves built assets, picking a brotli or gzip copy when accepted
+
+    def __init__(self, wsgi_app, static_folder, static_url_path, max_age):
+        self.wsgi_app = wsgi_app
+        self.folder = os.path.join(static_folder, BUILD_FOLDER)
+        self.prefix = f'{static_url_path}/{BUILD_FOLDER}/'
+        self.max_age = max_age
+
+    def __call__(self, environ, start_response):
+        url_path = environ.get('PATH_INFO', '')
+        if not url_path.startswith(self.prefix):
+            return self.wsgi_app(environ, start_response)
+        path = safe_join(self.folder, url_path[len(self.prefix):])
+        if path is None or not os.path.isfile(path):
+            return self.wsgi_app(environ, start_response) # lets flask answer with its usual 404
+
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        accepted = parse_accept_header(environ.get('HTTP_ACCEPT_ENCODING'))
+        encoding = None
+        for name, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if accepted.quality(name) > 0 and os.path.isfile(path + suffix):
+                encoding = name
+                path += suffix
+                break
+
+        # built file names change whenever their contents do, so browsers never need to check them again
+        response = send_file(path, environ, mimetype=mimetype, max_age=self.max_age)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        if encoding:
+            response.content_encoding = encoding
+        response.vary.add('Accept-Encoding')
+        return response(environ, start_response)
@@ -0,0 +1,179 @@
+import asyncio
+import threading
+import time
+import weakref
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from app.song_cache import normalize_key
+
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class AudioDBError(Exception): # raised when TheAudioDB can't be reached or sends back something unreadable
+    pass
+
+
+class Flight: # one upstream call that identical concurrent lookups wait on
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class AudioDBClient: # pooled, timeout bounded client for the TheAudioDB song api
+
+    def __init__(self, base_url, api_key, connect_timeout=3.05, read_timeout=5, retries=2, backoff=0.3, pool_size=10,
+                 observer=None):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.timeout = (connect_timeout, read_timeout)
+        self.observer = observer # called with the outcome and seconds of every upstream search
+
+        # keeps connections alive between requests and retries failed GETs with exponential backoff
+        retry = Retry(total=retries, connect=retries, read=retries, status=retries, backoff_factor=backoff,
+                      status_forcelist=RETRY_STATUSES, allowed_methods=frozenset(['GET']))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.inflight = {} # key -> Flight for lookups currently waiting on the upstream
+        self.lock = threading.Lock()
+
+    def search_track(self, song_name, artist_name): # returns the first matching track, or None if there is no match
+        key = normalize_key(song_name, artist_name)
+        return self.single_flight(key, lambda: self.request_track(song_name, artist_name))
+
+    def single_flight(self, key, call): # runs call() once for every concurrent caller asking for the same key
+        with self.lock:
+            flight = self.inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.inflight[key] = Flight()
+
+        if not leader: # another request is already fetching this song, waits for its answer
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = call()
+        except Exception as error:
+            flight.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.inflight[key]
+            flight.done.set()
+        return flight.result
+
+    def request_track(self, song_name, artist_name): # sends the search to the api
+        url = f'{self.base_url}/{self.api_key}/searchtrack.php'
+        start = time.perf_counter()
+        try:
+            # params are url encoded by requests, so names with & or # in them search correctly
+            response = self.session.get(url, params={'s': artist_name, 't': song_name}, timeout=self.timeout)
+            response.raise_for_status()
+            get_data = response.json()
+        except (requests.RequestException, ValueError) as error:
+            self.observe('error', start)
+            raise AudioDBError(f'TheAudioDB search failed: {error}') from error
+
+        return first_track(get_data, self.observe, start)
+
+    def observe(self, outcome, start):
+        if self.observer is not None:
+            self.observer(outcome, time.perf_counter() - start)
+
+
+def first_track(get_data, observe, start): # the first track of a search response, or None
+    if get_data and get_data.get('track'): # checks if the song exists
+        observe('found', start)
+        return get_data['track'][0]
+    observe('not_found', start)
+    return None
+
+
+class AsyncAudioDBClient: # httpx version of the client for the async serving mode, see asgi.py
+
+    def __init__(self, base_url, api_key, connect_timeout=3.05, read_timeout=5, retries=2, backoff=0.3, pool_size=10,
+                 observer=None):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.observer = observer
+        self.clients = weakref.WeakKeyDictionary() # event loop -> httpx client, connections can't move between loops
+        self.inflight = {} # (event loop, key) -> future for lookups currently waiting on the upstream
+
+    def client(self):
+        import httpx # only needed in the async serving mode
+        loop = asyncio.get_running_loop()
+        client = self.clients.get(loop)
+        if client is None:
+            client = self.clients[loop] = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size))
+        return client
+
+    async def search_track(self, song_name, artist_name): # returns the first matching track, or None if there is no match
+        loop = asyncio.get_running_loop()
+        key = (loop, normalize_key(song_name, artist_name))
+        flight = self.inflight.get(key)
+        if flight is not None: # another request is already fetching this song, waits for its answer
+            return await asyncio.shield(flight)
+
+        flight = self.inflight[key] = loop.create_future()
+        try:
+            result = await self.request_track(song_name, artist_name)
+        except asyncio.CancelledError: # the server dropped the request, the waiting ones are dropped with it
+            flight.cancel()
+            raise
+        except Exception as error:
+            flight.set_exception(error)
+            flight.exception() # marks it retrieved, the error is raised here when nobody else waited
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            del self.inflight[key]
+
+    def search_track_from_thread(self, song_name, artist_name): # search_track for the wsgi app running in the thread pool
+        from asgiref.sync import async_to_sync
+        # runs on the server's event loop, so every request shares its connections and in-flight searches
+        return async_to_sync(self.search_track)(song_name, artist_name)
+
+    async def request_track(self, song_name, artist_name): # sends the search, retrying like the sync client
+        import httpx
+        url = f'{self.base_url}/{self.api_key}/searchtrack.php'
+        start = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self.client().get(url, params={'s': artist_name, 't': song_name})
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    response.raise_for_status()
+                    return first_track(response.json(), self.observe, start)
+            except httpx.TransportError as error: # connect or read failures and timeouts
+                if attempt == self.retries:
+                    self.observe('error', start)
+                    raise AudioDBError(f'TheAudioDB search failed: {error}') from error
+            except (httpx.HTTPStatusError, ValueError) as error:
+                self.observe('error', start)
+                raise AudioDBError(f'TheAudioDB search failed: {error}') from error
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    def observe(self, outcome, start):
+        if self.observer is not None:
+            self.observer(outcome, time.perf_counter() - start)
+
+    async def aclose(self): # closes the connections of the clients made on this event loop
+        client = self.clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
@@ -0,0 +1,202 @@
+import bisect
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from app import app, db, background
+from app.models import FavouriteSong, VotedSongs, ArchivedEventVote, CatalogTrack
+from app.song_cache import clean_name, normalize_key
+
+
+MIN_PREFIX = 2 # characters typed before suggestions start
+TOP = 32 # most popular songs kept for a prefix
+SCAN_LIMIT = 256 # most terms a suggestion looks at, prefixes with more have their top songs worked out in advance
+MAX_RECENT = 20000 # smaller prefixes with their top songs kept, least recently asked for go first
+LAST = '\U0010ffff' # sorts after every character, so prefix + LAST ends the prefix's range
+
+
+def word_starts(name): # the cleaned name from each word on, so "kill" finds "the killers"
+    words = clean_name(name).split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+def starts_a_word(text, name): # checks if text is the start of the name or of one of its words
+    return (' ' + name).find(' ' + text) >= 0
+
+
+class PrefixIndex: # song and artist names in one sorted array, searched by prefix with bisect
+
+    def __init__(self, max_age=600):
+        self.max_age = max_age # seconds before it is rebuilt, picking up favourites and votes from other workers
+        self.terms = [] # sorted (field + name from a word on, key), field is "s" for songs and "a" for artists
+        self.songs = {} # key -> [song_name, artist_name, song_key, artist_key, popularity]
+        self.top = {} # prefix -> keys of the TOP most popular songs, best first, for prefixes with many terms
+        self.recent = OrderedDict() # the same for smaller prefixes, filled as they are asked for
+        self.built_at = None
+        self.rebuilding = False
+        self.lock = threading.Lock()
+
+    ### BUILDING ###
+
+    def load(self): # the songs people have favourited, voted for or searched, with how popular each one is
+        songs = {}
+
+        def count(song_name, artist_name, weight):
+            song_key, artist_key = clean_name(song_name), clean_name(artist_name)
+            if not song_key or not artist_key:
+                return
+            key = normalize_key(song_name, artist_name)
+            entry = songs.get(key)
+            if entry is None:
+                songs[key] = [song_name, artist_name, song_key, artist_key, weight]
+            else:
+                entry[4] += weight
+
+        # the catalog goes first so its spelling is shown over however a guest typed it
+        for song_name, artist_name in db.session.execute(db.select(CatalogTrack.song_name, CatalogTrack.artist_name)):
+            count(song_name, artist_name, 0)
+        for model in (FavouriteSong, VotedSongs, ArchivedEventVote):
+            for song_name, artist_name, total in db.session.execute(
+                    db.select(model.song_name, model.artist_name, db.func.count())
+                    .group_by(model.song_name, model.artist_name)):
+                count(song_name, artist_name, total)
+        return songs
+
+    def index_terms(self, key, entry):
+        return [('s' + text, key) for text in word_starts(entry[2])] + \
+               [('a' + text, key) for text in word_starts(entry[3])]
+
+    def busy_prefixes(self, terms, ranks): # the top songs of every prefix with more than SCAN_LIMIT terms
+        top = {}
+        pending = [(0, len(terms), MIN_PREFIX + 1)] # ranges of terms still to split on their first characters
+        while pending:
+            start, end, length = pending.pop()
+            i = start
+            while i < end:
+                text = terms[i][0]
+                if len(text) < length: # the whole term is a shorter prefix, already counted
+                    i += 1
+                    continue
+                prefix = text[:length]
+                j = bisect.bisect_left(terms, (prefix + LAST,), i, end)
+                if j - i > SCAN_LIMIT:
+                    top[prefix] = heapq.nsmallest(TOP, {key for _, key in terms[i:j]}, key=ranks.__getitem__)
+                    pending.append((i, j, length + 1))
+                i = j
+        return top
+
+    def rebuild(self):
+        songs = self.load()
+        terms = sorted(term for key, entry in songs.items() for term in self.index_terms(key, entry))
+        top = self.busy_prefixes(terms, {key: (-entry[4], entry[0].casefold()) for key, entry in songs.items()})
+        with self.lock:
+            self.songs, self.terms, self.top = songs, terms, top
+            self.recent.clear()
+            self.built_at = time.monotonic()
+            self.rebuilding = False
+
+    def ensure_built(self): # builds the index on first use, then refreshes it in the background once it is old
+        if self.built_at is None:
+            self.rebuild()
+            return
+        with self.lock:
+            if self.rebuilding or time.monotonic() - self.built_at < self.max_age:
+                return
+            self.rebuilding = True
+
+        def run():
+            try:
+                with app.app_context():
+                    self.rebuild()
+            except Exception: # keeps answering from the old index
+                app.logger.exception('autocomplete rebuild failed')
+                with self.lock:
+                    self.rebuilding = False
+
+        background.submit(run)
+
+    def add(self, song_name, artist_name, weight=1): # counts a new favourite or vote, or a song first seen in a search
+        song_key, artist_key = clean_name(song_name), clean_name(artist_name)
+        if self.built_at is None or not song_key or not artist_key:
+            return # before the first build there is nothing to add to, the build reads it from the database
+        key = normalize_key(song_name, artist_name)
+        with self.lock:
+            entry = self.songs.get(key)
+            if entry is None:
+                entry = self.songs[key] = [song_name, artist_name, song_key, artist_key, 0]
+                for term in self.index_terms(key, entry):
+                    bisect.insort(self.terms, term)
+            entry[4] = max(entry[4] + weight, 0)
+            for text, _ in self.index_terms(key, entry):
+                for end in range(MIN_PREFIX + 1, len(text) + 1):
+                    self.rerank(text[:end], key, weight < 0)
+
+    def rerank(self, prefix, key, dropped): # keeps a prefix's top songs right after one of its songs changed
+        kept = self.top if prefix in self.top else self.recent
+        top = kept.get(prefix)
+        if top is None:
+            return
+        if key in top:
+            if dropped and len(top) == TOP: # a song that was left out might now be more popular
+                del kept[prefix]
+                return
+            top.sort(key=self.rank)
+        elif len(top) < TOP or self.rank(key) < self.rank(top[-1]):
+            bisect.insort(top, key, key=self.rank)
+            del top[TOP:]
+
+    ### SEARCHING ###
+
+    def rank(self, key): # most popular first, then alphabetical
+        entry = self.songs[key]
+        return -entry[4], entry[0].casefold()
+
+    def span(self, prefix): # where the terms starting with prefix are in the sorted array
+        return bisect.bisect_left(self.terms, (prefix,)), bisect.bisect_left(self.terms, (prefix + LAST,))
+
+    def scan(self, prefix, keep=None, limit=None): # the songs with a term starting with prefix, best first
+        start, end = self.span(prefix)
+        if limit is not None:
+            end = min(end, start + limit)
+        keys = {key for _, key in self.terms[start:end] if keep is None or keep(self.songs[key])}
+        return heapq.nsmallest(TOP, keys, key=self.rank)
+
+    def ranked(self, prefix): # the top songs for a prefix, kept from the build or from the last time it was asked for
+        top = self.top.get(prefix)
+        if top is not None:
+            return top
+        top = self.recent.get(prefix)
+        if top is None: # fewer than SCAN_LIMIT terms, unless some were added since the build
+            top = self.recent[prefix] = self.scan(prefix)
+            if len(self.recent) > MAX_RECENT:
+                self.recent.popitem(last=False)
+        else:
+            self.recent.move_to_end(prefix)
+        return top
+
+    def suggest(self, song_name, artist_name, limit=8): # the most popular songs starting with what has been typed
+        song_text, artist_text = clean_name(song_name), clean_name(artist_name)
+        if len(song_text) < MIN_PREFIX and len(artist_text) < MIN_PREFIX:
+            return []
+
+        self.ensure_built()
+        with self.lock:
+            if len(artist_text) < MIN_PREFIX:
+                keys = self.ranked('s' + song_text)
+            elif len(song_text) < MIN_PREFIX:
+                keys = self.ranked('a' + artist_text)
+            else: # both typed, the songs near the top for either that match the other, or the best of a bounded scan
+                def matches(entry):
+                    return starts_a_word(song_text, entry[2]) and starts_a_word(artist_text, entry[3])
+
+                keys = sorted({key for key in self.ranked('s' + song_text) + self.ranked('a' + artist_text)
+                               if matches(self.songs[key])}, key=self.rank)
+                if len(keys) < limit:
+                    song_span, artist_span = self.span('s' + song_text), self.span('a' + artist_text)
+                    prefix = 's' + song_text if song_span[1] - song_span[0] <= artist_span[1] - artist_span[0] \
+                        else 'a' + artist_text
+                    keys = sorted(set(keys).union(self.scan(prefix, matches, SCAN_LIMIT)), key=self.rank)
+            return [{'song_name': self.songs[key][0], 'artist_name': self.songs[key][1]} for key in keys[:limit]]
+
+
+song_index = PrefixIndex(app.config['AUTOCOMPLETE_MAX_AGE'])
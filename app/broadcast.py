@@ -0,0 +1,66 @@
+import json
+import queue
+import threading
+
+
+def format_message(kind, data): # formats one server-sent event
+    return f'event: {kind}\ndata: {json.dumps(data)}\n\n'
+
+
+class Broadcaster: # fans event page updates out to every open stream in this process
+
+    def __init__(self, max_queue=16):
+        self.max_queue = max_queue # messages kept for a slow client before the oldest are dropped
+        self.subscribers = {} # event_id -> set of queues, one per open stream
+        self.lock = threading.Lock()
+
+    def subscribe(self, event_id):
+        messages = queue.Queue(maxsize=self.max_queue)
+        with self.lock:
+            self.subscribers.setdefault(event_id, set()).add(messages)
+        return messages
+
+    def unsubscribe(self, event_id, messages):
+        with self.lock:
+            streams = self.subscribers.get(event_id)
+            if streams is not None:
+                streams.discard(messages)
+                if not streams:
+                    del self.subscribers[event_id]
+
+    def subscriber_count(self, event_id):
+        with self.lock:
+            return len(self.subscribers.get(event_id, ()))
+
+    def publish(self, event_id, kind, data): # sends a message to everyone watching an event
+        message = format_message(kind, data)
+        with self.lock:
+            streams = list(self.subscribers.get(event_id, ()))
+        for messages in streams:
+            while True:
+                try:
+                    messages.put_nowait(message)
+                    break
+                except queue.Full: # a slow client only needs the newest state, drops its oldest message
+                    try:
+                        messages.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def listen(self, event_id, keepalive=15, idle=None): # yields messages for one stream until the client goes away
+        messages = self.subscribe(event_id)
+        try:
+            yield 'retry: 5000\n\n' # tells the browser how long to wait before reconnecting
+            while True:
+                try:
+                    yield messages.get(timeout=keepalive)
+                except queue.Empty:
+                    # publish only reaches streams in this process, idle returns a (kind, data) message for changes
+                    # made by other workers, or None
+                    message = idle() if idle is not None else None
+                    if message is not None:
+                        yield format_message(*message)
+                    else:
+                        yield ': keepalive\n\n' # comment line that stops proxies closing an idle connection
+        finally:
+            self.unsubscribe(event_id, messages)
@@ -0,0 +1,121 @@
+import datetime
+import difflib
+import json
+from sqlalchemy import inspect
+from app import app, db
+from app.models import CatalogTrack
+from app.song_cache import clean_name
+
+
+MATCH_RATIO = 0.8 # how close a misspelt song and artist must be to a catalog track to answer with it
+CANDIDATES = 20 # full-text matches rescored for each search
+
+search_table = None # whether the catalog_search fts table exists, checked once per worker
+
+
+def has_search_table():
+    global search_table
+    if search_table is None:
+        search_table = db.engine.dialect.name == 'sqlite' and inspect(db.engine).has_table('catalog_search')
+    return search_table
+
+
+def add(payload): # stores a track the api returned, in the current transaction
+    try:
+        track_id = int(payload['idTrack'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    track = db.session.get(CatalogTrack, track_id)
+    if track is None:
+        track = CatalogTrack(track_id=track_id)
+        db.session.add(track)
+    track.song_name = payload.get('strTrack')
+    track.artist_name = payload.get('strArtist')
+    track.album = payload.get('strAlbum')
+    track.song_key = clean_name(track.song_name)
+    track.artist_key = clean_name(track.artist_name)
+    track.payload = json.dumps(payload)
+    track.seen_at = datetime.datetime.utcnow()
+    return track
+
+
+def trigrams(value): # the fts5 trigram query terms for a string, quoted so punctuation is matched literally
+    return ['"' + value[i:i + 3].replace('"', '""') + '"' for i in range(len(value) - 2)]
+
+
+def search_statement(terms): # the full-text search for tracks matching any of the trigrams
+    return db.text('SELECT rowid FROM catalog_search WHERE catalog_search MATCH :terms ORDER BY rank LIMIT :limit') \
+        .bindparams(terms=' OR '.join(terms), limit=CANDIDATES)
+
+
+def candidates_query(cutoff, track_ids=None, artist_key=None): # the tracks found by full text, or by artist prefix
+    if track_ids is not None:
+        query = CatalogTrack.query.filter(CatalogTrack.track_id.in_(track_ids))
+    else: # no full-text index, matches the first letters of the artist through the key index
+        query = CatalogTrack.query.filter(CatalogTrack.artist_key.startswith(artist_key[:3], autoescape=True))
+    return query.filter(CatalogTrack.seen_at >= cutoff).limit(CANDIDATES)
+
+
+def candidates(song_key, artist_key, cutoff): # catalog tracks that share some spelling with the search
+    if has_search_table():
+        terms = trigrams(song_key) + trigrams(artist_key)
+        if not terms:
+            return []
+        track_ids = db.session.execute(search_statement(terms)).scalars().all()
+        if not track_ids:
+            return []
+        return candidates_query(cutoff, track_ids=track_ids).all()
+    return candidates_query(cutoff, artist_key=artist_key).all()
+
+
+def similarity(typed, stored): # 1 for a prefix of the stored name, otherwise how alike the two spellings are
+    if len(typed) >= 3 and stored.startswith(typed):
+        return 1.0
+    return difflib.SequenceMatcher(None, typed, stored).ratio()
+
+
+def find_query(song_key, artist_key, cutoff):
+    return CatalogTrack.query.filter_by(artist_key=artist_key, song_key=song_key) \
+        .filter(CatalogTrack.seen_at >= cutoff)
+
+
+def find(song_name, artist_name): # answers a search spelt exactly like a catalog track, returns the payload or None
+    song_key, artist_key = clean_name(song_name), clean_name(artist_name)
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=app.config['CATALOG_MAX_AGE'])
+    track = find_query(song_key, artist_key, cutoff).first()
+    return json.loads(track.payload) if track is not None else None
+
+
+def find_close(song_name, artist_name): # the closest track whose song and artist both nearly match, or None
+    # only asked once the api has no result, "Song 1" is a close spelling of "Song 15" but a different song
+    song_key, artist_key = clean_name(song_name), clean_name(artist_name)
+    if not song_key or not artist_key:
+        return None
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=app.config['CATALOG_MAX_AGE'])
+    track, best = None, 0
+    for candidate in candidates(song_key, artist_key, cutoff):
+        score = min(similarity(song_key, candidate.song_key), similarity(artist_key, candidate.artist_key))
+        if score >= MATCH_RATIO and score > best:
+            track, best = candidate, score
+    return json.loads(track.payload) if track is not None else None
+
+
+def export(out): # writes every catalog track as one json line, for starting another deployment warm
+    count = 0
+    for track in CatalogTrack.query.order_by(CatalogTrack.track_id).yield_per(500):
+        out.write(track.payload + '\n')
+        count += 1
+    return count
+
+
+def load(lines, batch_size=500): # adds exported json lines to the catalog, committing in batches
+    count = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        if add(json.loads(line)) is not None:
+            count += 1
+            if count % batch_size == 0:
+                db.session.commit()
+    db.session.commit()
+    return count
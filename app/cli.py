@@ -0,0 +1,120 @@
+import os
+import click
+from app import app, db
+from app import tallies as vote_tallies
+
+
+@app.cli.group()
+def tallies():
+    """Vote tally maintenance commands."""
+    pass
+
+
+@tallies.command()
+@click.option('--event', 'event_id', type=int, help='Only check this event.')
+def verify(event_id):
+    """Compare the stored vote tallies with the raw votes."""
+    drift = vote_tallies.find_drift(event_id)
+    for event, track, stored, counted in drift:
+        click.echo(f'event {event} track {track}: stored {stored}, counted {counted}')
+    if drift:
+        raise click.ClickException(f'{len(drift)} tallies have drifted, run "flask tallies rebuild"')
+    click.echo('All vote tallies match the votes.')
+
+
+@tallies.command()
+@click.option('--event', 'event_id', type=int, help='Only rebuild this event.')
+def rebuild(event_id):
+    """Recompute the vote tallies from the raw votes."""
+    vote_tallies.rebuild(event_id)
+    click.echo('Vote tallies rebuilt.')
+
+
+@app.cli.command()
+def plans():
+    """Print the query plan of each busy route and fail on full table scans."""
+    from app.query_plans import route_queries, explain, is_full_scan, needs_sort
+
+    if db.engine.dialect.name != 'sqlite':
+        raise click.ClickException('flask plans reads sqlite query plans, run it against a sqlite copy of the schema')
+    problems = 0
+    for route, description, statement in route_queries():
+        click.echo(f'{route}: {description}')
+        for step in explain(statement):
+            flag = ''
+            if is_full_scan(step):
+                flag = '  <-- full table scan'
+                problems += 1
+            elif needs_sort(step):
+                flag = '  <-- sorted without an index'
+                problems += 1
+            click.echo(f'    {step}{flag}')
+    if problems:
+        raise click.ClickException(f'{problems} query plan steps are not index bound')
+    click.echo('Every route query is index bound.')
+
+
+@app.cli.group()
+def assets():
+    """Static file build commands."""
+    pass
+
+
+@assets.command()
+def build():
+    """Fingerprint, convert and precompress the static files into app/static/dist."""
+    from app.assets import build as build_assets
+
+    manifest = build_assets(app.static_folder, log=click.echo)
+    click.echo(f'Built {len(manifest)} static files, restart the app to serve them.')
+
+
+@assets.command()
+def clean():
+    """Remove the built static files so the originals are served again."""
+    import shutil
+    from app.assets import BUILD_FOLDER
+
+    shutil.rmtree(os.path.join(app.static_folder, BUILD_FOLDER), ignore_errors=True)
+    click.echo('Removed the built static files.')
+
+
+@app.cli.group(name='tracks')
+def tracks_group():
+    """Stored song metadata commands."""
+    pass
+
+
+@tracks_group.command()
+@click.option('--limit', type=int, default=500, help='Most tracks to refresh in one run.')
+def refresh(limit):
+    """Fetch new metadata for tracks that have none or where it is old."""
+    from app import tracks
+
+    stale = tracks.stale_tracks(limit)
+    updated = tracks.refresh(stale)
+    click.echo(f'Refreshed {updated} of {len(stale)} stale tracks.')
+
+
+@app.cli.group(name='catalog')
+def catalog_group():
+    """Local track catalog commands."""
+    pass
+
+
+@catalog_group.command()
+@click.argument('path', type=click.File('w'))
+def export(path):
+    """Write every catalog track to PATH as json lines."""
+    from app import catalog
+
+    click.echo(f'Exported {catalog.export(path)} tracks.')
+
+
+@catalog_group.command()
+@click.argument('path', type=click.File('r'))
+def load(path):
+    """Add the tracks in a json lines export to the catalog."""
+    from app import catalog
+
+    click.echo(f'Loaded {catalog.load(path)} tracks.')
@@ -0,0 +1,46 @@
+import sqlite3
+from sqlalchemy import event
+
+
+def engine_options(config): # the SQLALCHEMY_ENGINE_OPTIONS for the configured database profile
+    profile = config['DATABASE_PROFILE']
+    if profile == 'sqlite':
+        # how long a connection waits on another writer's lock before "database is locked"
+        return {'connect_args': {'timeout': config['SQLITE_BUSY_TIMEOUT'] / 1000}}
+    if profile == 'postgresql':
+        timeouts = (f"-c statement_timeout={config['DATABASE_STATEMENT_TIMEOUT']} "
+                    f"-c lock_timeout={config['DATABASE_LOCK_TIMEOUT']}")
+        return {
+            'pool_size': config['DATABASE_POOL_SIZE'],
+            'max_overflow': config['DATABASE_MAX_OVERFLOW'],
+            'pool_timeout': config['DATABASE_POOL_TIMEOUT'],
+            'pool_recycle': config['DATABASE_POOL_RECYCLE'], # drops connections before the server or a proxy does
+            'pool_pre_ping': True, # replaces connections that died while idle instead of failing a request
+            'connect_args': {'options': timeouts},
+        }
+    return {} # "default", sqlalchemy's own settings
+
+
+def sqlite_pragmas(config): # run on every new sqlite connection
+    return [
+        ('journal_mode', 'WAL'), # readers no longer block the writer or each other
+        ('busy_timeout', config['SQLITE_BUSY_TIMEOUT']),
+        ('synchronous', 'NORMAL'), # safe with WAL, only the last commits can be lost on a power cut
+        ('mmap_size', config['SQLITE_MMAP_SIZE']),
+        ('cache_size', config['SQLITE_CACHE_SIZE']), # negative means KiB rather than pages
+        ('temp_store', 'MEMORY'),
+    ]
+
+
+def configure_engine(engine, config): # applies the parts of a profile that have to run per connection
+    if config['DATABASE_PROFILE'] != 'sqlite' or engine.dialect.name != 'sqlite':
+        return
+    pragmas = sqlite_pragmas(config)
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        if isinstance(dbapi_connection, sqlite3.Connection):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+            cursor.close()
@@ -0,0 +1,12 @@
+from app.models import Events
+
+
+def bump(event_ids): # marks events' leaderboards or members as changed, in the current transaction
+    if isinstance(event_ids, int):
+        event_ids = [event_ids]
+    Events.query.filter(Events.event_id.in_(event_ids)) \
+        .update({Events.version: Events.version + 1}, synchronize_session=False)
+
+
+def bump_all(): # for changes made across every event at once, like rebuilding the tallies
+    Events.query.update({Events.version: Events.version + 1}, synchronize_session=False)
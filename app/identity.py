@@ -0,0 +1,61 @@
+import threading
+from collections import OrderedDict
+from sqlalchemy.orm import load_only, make_transient_to_detached
+from app import app, db, login
+from app.models import User
+
+
+# the only user columns a normal request needs, everything else (about me, pfp, email...) loads on first use
+LOGIN_COLUMNS = ('user_id', 'username', 'in_event', 'current_event_id', 'event_role', 'version')
+
+
+class IdentityCache: # small per worker cache of the login columns for recently seen users
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.users = OrderedDict() # user_id -> dict of login columns, least recently used first
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        with self.lock:
+            columns = self.users.get(user_id)
+            if columns is not None:
+                self.users.move_to_end(user_id)
+            return columns
+
+    def put(self, columns):
+        with self.lock:
+            self.users[columns['user_id']] = columns
+            self.users.move_to_end(columns['user_id'])
+            while len(self.users) > self.max_entries:
+                self.users.popitem(last=False)
+
+    def discard(self, user_id):
+        with self.lock:
+            self.users.pop(user_id, None)
+
+
+user_cache = IdentityCache(app.config['USER_CACHE_SIZE'])
+
+
+@login.user_loader # loads the logged in user for every request
+def load_user(user_id):
+    user_id = int(user_id)
+
+    # a cached user only needs its version checked, which reads one integer by primary key
+    columns = user_cache.get(user_id)
+    if columns is not None:
+        version = db.session.execute(db.select(User.version).where(User.user_id == user_id)).scalar()
+        if version == columns['version']:
+            # rebuilds the user from the cache and attaches it to the session as if it had been loaded
+            user = User(**columns)
+            make_transient_to_detached(user) # columns that weren't cached are left to load when first used
+            return db.session.merge(user, load=False)
+
+    # first request in this worker, or the user has changed since it was cached
+    user = db.session.get(User, user_id, options=[load_only(*[getattr(User, name) for name in LOGIN_COLUMNS])])
+    if user is None: # the user has been deleted
+        user_cache.discard(user_id)
+        return None
+    user_cache.put({name: getattr(user, name) for name in LOGIN_COLUMNS})
+    return user
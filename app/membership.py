@@ -0,0 +1,36 @@
+from collections import namedtuple
+from flask import g
+from flask_login import current_user
+
+
+Membership = namedtuple('Membership', ['event_id', 'is_admin', 'is_dj'])
+
+
+def current_membership(): # the event the current user is in, worked out at most once per request
+    if '_membership' not in g:
+        membership = None
+        if current_user.is_authenticated and current_user.in_event and current_user.current_event_id is not None:
+            role = current_user.event_role
+            membership = Membership(current_user.current_event_id, role == 'admin', role == 'dj')
+        g._membership = membership
+    return g._membership
+
+
+def join_event(user, event_id, role): # marks a user as being in an event, the caller adds the EventUsers row
+    user.in_event = True
+    user.current_event_id = event_id
+    user.event_role = role
+    user.bump_version() # logs the change so cached copies of the user are reloaded
+    g.pop('_membership', None)
+
+
+def leave_event(user): # marks a user as no longer being in an event, the caller removes the EventUsers row
+    user.in_event = False
+    user.current_event_id = None
+    user.event_role = None
+    user.bump_version() # logs the change so cached copies of the user are reloaded
+    g.pop('_membership', None)
+
+
+def forget_membership(): # drops the cached membership after a bulk update has changed it
+    g.pop('_membership', None)
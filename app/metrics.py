@@ -0,0 +1,116 @@
+import bisect
+import threading
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10) # seconds
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89) # sql statements per request
+
+
+def format_labels(names, values, extra=''):
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def escape(value): # label values can't hold raw backslashes, quotes or newlines
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter: # a value per label set that only goes up
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values = {} # label values -> total
+        self.lock = threading.Lock()
+
+    def inc(self, label_values=(), amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        with self.lock:
+            for label_values, total in sorted(self.values.items()):
+                lines.append(f'{self.name}{format_labels(self.labels, label_values)} {format_number(total)}')
+        return lines
+
+
+class Histogram: # bucketed observations per label set, summed at scrape time rather than on every observe
+
+    def __init__(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {} # label values -> [count per bucket (the last one is +Inf), sum]
+        self.lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            snapshot = sorted((label_values, list(counts), total) for label_values, (counts, total) in self.series.items())
+        for label_values, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = f'le="{format_number(bound)}"' if bound != '+Inf' else 'le="+Inf"'
+                lines.append(f'{self.name}_bucket{format_labels(self.labels, label_values, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(self.labels, label_values)} {format_number(total)}')
+            lines.append(f'{self.name}_count{format_labels(self.labels, label_values)} {cumulative}')
+        return lines
+
+
+class Metrics: # the app's request, database, api and template measurements, kept per worker process
+
+    def __init__(self):
+        self.requests = Counter('http_requests_total', 'Requests handled.', ('endpoint', 'method', 'status'))
+        self.request_seconds = Histogram('http_request_duration_seconds', 'Time spent handling a request.',
+                                         ('endpoint', 'method'))
+        self.sql_statements = Histogram('http_request_sql_statements', 'SQL statements run by a request.',
+                                        ('endpoint',), COUNT_BUCKETS)
+        self.sql_seconds = Histogram('http_request_sql_duration_seconds', 'Time a request spent running SQL.',
+                                     ('endpoint',))
+        self.api_calls = Counter('audiodb_requests_total', 'Searches sent to TheAudioDB.', ('outcome',))
+        self.api_seconds = Histogram('audiodb_request_duration_seconds', 'Time TheAudioDB took to answer a search.',
+                                     ('outcome',))
+        self.template_seconds = Histogram('template_render_duration_seconds', 'Time spent rendering a template.',
+                                          ('template',))
+        self.collectors = [] # callables returning extra lines, read at scrape time
+
+    def observe_request(self, endpoint, method, status, seconds, statements, sql_seconds):
+        self.requests.inc((endpoint, method, str(status)))
+        self.request_seconds.observe((endpoint, method), seconds)
+        self.sql_statements.observe((endpoint,), statements)
+        self.sql_seconds.observe((endpoint,), sql_seconds)
+
+    def observe_api(self, outcome, seconds):
+        self.api_calls.inc((outcome,))
+        self.api_seconds.observe((outcome,), seconds)
+
+    def observe_template(self, template, seconds):
+        self.template_seconds.observe((template,), seconds)
+
+    def render(self): # every metric in the prometheus text exposition format
+        lines = []
+        for metric in (self.requests, self.request_seconds, self.sql_statements, self.sql_seconds,
+                       self.api_calls, self.api_seconds, self.template_seconds):
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
@@ -1,27 +1,39 @@
 from app import db
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
-from app import login
+from sqlalchemy.orm import validates
+import datetime
+
+
+def normalize_username(username): # the form of a username that searches match against, ignoring case
+    return (username or '').strip().casefold()
 
 
 class User(UserMixin, db.Model): # model for the user table
+    __table_args__ = (
+        # prefix searches read a range of it in name order, the user id breaks ties for paging
+        db.Index('ix_user_username_normalized', 'username_normalized', 'user_id'),
+    )
 
     # information about the user
     user_id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), index=True, unique=True)
+    username_normalized = db.Column(db.String(64)) # set with the username, for prefix searches
     email = db.Column(db.String(120), index=True, unique=True)
     password_hash = db.Column(db.String(128))
     about_me = db.Column(db.String(140))
     in_event = db.Column(db.Boolean, default=False)
     pfp = db.Column(db.String(140))
+    current_event_id = db.Column(db.Integer, index=True) # the event the user is in, kept in sync with event_users
+    event_role = db.Column(db.String(8)) # 'admin', 'dj' or 'guest' while the user is in an event
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0') # bumped whenever the cached login data changes
 
     # relationships to other tables
     events = db.relationship('Events', back_populates='user')
     songs = db.relationship('FavouriteSong', back_populates='user')
     event_users = db.relationship('EventUsers', back_populates='user')
     voted_songs = db.relationship('VotedSongs', back_populates='user')
-    song_reviews = db.relationship('SongReviews', back_populates='user', foreign_keys='SongReviews.user_id')
-    username_rel = db.relationship('SongReviews', back_populates='username_rel', foreign_keys='SongReviews.username')
+    song_reviews = db.relationship('SongReviews', back_populates='user')
 
     def get_id(self): # returns the user id as a string
         return str(self.user_id)
@@ -35,15 +47,24 @@ class User(UserMixin, db.Model): # model for the user table
     def check_password (self, password): # checks the password hash
         return check_password_hash(self.password_hash, password)
 
+    @validates('username')
+    def set_username_normalized(self, key, username): # keeps the search column in step with the username
+        self.username_normalized = normalize_username(username)
+        return username
+
+    def bump_version(self): # marks the users cached login data as out of date in every worker
+        self.version = User.version + 1
+
 class Events(db.Model): # model for the events table
     # information about the event
     event_id = db.Column(db.Integer, primary_key=True, unique=True)
     event_name = db.Column(db.String(64), index=True, unique=True)
     event_code = db.Column(db.Integer, unique=True)
     active_status = db.Column(db.Boolean, default=False)
-    event_location = db.Column(db.String(140), index=True)
-    event_description = db.Column(db.String(140), index=True)
+    event_location = db.Column(db.String(140))
+    event_description = db.Column(db.String(140))
     dj_id = db.Column(db.Integer, index=True)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0') # bumped whenever its votes or members change
 
     # information with foreign keys
     user_id = db.Column(db.Integer, db.ForeignKey('user.user_id', name='fk_user_id'))
@@ -52,6 +73,7 @@ class Events(db.Model): # model for the events table
     user = db.relationship('User', back_populates='events')
     event_users = db.relationship('EventUsers', back_populates='event')
     voted_songs = db.relationship('VotedSongs', back_populates='event')
+    vote_tallies = db.relationship('VoteTally', back_populates='event')
 
     def __repr__(self): # returns a string representation of the event
         return '<Event {}>'.format(self.event_name)
@@ -61,17 +83,24 @@ class Events(db.Model): # model for the events table
 
 
 class FavouriteSong(db.Model): # model for the favourite songs table
+    # a users favourites are looked up by track and listed newest or oldest first
+    __table_args__ = (
+        db.Index('ix_favourite_song_user_track', 'user_id', 'track_id'),
+        db.Index('ix_favourite_song_user_song', 'user_id', 'song_id'),
+    )
+
     # information about the song
     song_id = db.Column(db.Integer, primary_key=True, unique=True)
-    track_id = db.Column(db.Integer, index=True)
-    song_name = db.Column(db.String(64), index=True)
-    artist_name = db.Column(db.String(64), index=True)
+    track_id = db.Column(db.Integer)
+    song_name = db.Column(db.String(64))
+    artist_name = db.Column(db.String(64))
 
     # information with foreign keys
     user_id = db.Column(db.Integer, db.ForeignKey('user.user_id', name='songs_user_id'))
 
     # relationships to other tables
     user = db.relationship('User', back_populates='songs')
+    track = db.relationship('Track', primaryjoin='foreign(FavouriteSong.track_id) == Track.track_id', viewonly=True)
 
     def __repr__(self): # returns a string representation of the song
         return '<Song {}>'.format(self.song_name)
@@ -81,6 +110,12 @@ class FavouriteSong(db.Model): # model for the favourite songs table
 
 
 class EventUsers(db.Model): # model for the event users table
+    # members are listed by event in the order they joined, and removed by user
+    __table_args__ = (
+        db.Index('ix_event_users_event', 'event_id', 'event_user_id'),
+        db.Index('ix_event_users_user', 'user_id', 'event_id'),
+    )
+
     # information about the event user
     event_user_id = db.Column(db.Integer, primary_key=True, unique=True)
     is_admin = db.Column(db.Boolean, default=False)
@@ -101,11 +136,16 @@ class EventUsers(db.Model): # model for the event users table
         return str(self.event_user_id)
 
 class VotedSongs(db.Model): # model for the voted songs table
+    # one vote per guest per song, also covers every per event or per song lookup
+    __table_args__ = (
+        db.Index('ix_voted_songs_event_track_user', 'event_id', 'track_id', 'user_id', unique=True),
+    )
+
     # information about the voted song
     vote_id = db.Column(db.Integer, primary_key=True, unique=True)
-    track_id = db.Column(db.Integer, index=True)
-    song_name = db.Column(db.String(64), index=True)
-    artist_name = db.Column(db.String(64), index=True)
+    track_id = db.Column(db.Integer)
+    song_name = db.Column(db.String(64))
+    artist_name = db.Column(db.String(64))
 
     # information with foreign keys
     event_id = db.Column(db.Integer, db.ForeignKey('events.event_id', name='voted_songs_event_id'))
@@ -114,6 +154,7 @@ class VotedSongs(db.Model): # model for the voted songs table
     # relationships to other tables
     event = db.relationship('Events', back_populates='voted_songs')
     user = db.relationship('User', back_populates='voted_songs')
+    track = db.relationship('Track', primaryjoin='foreign(VotedSongs.track_id) == Track.track_id', viewonly=True)
 
     def __repr__(self): # returns a string representation of the voted song
         return '<VotedSongs {}>'.format(self.vote_id)
@@ -121,19 +162,84 @@ class VotedSongs(db.Model): # model for the voted songs table
     def get_id(self): # returns the voted song id as a string
         return str(self.vote_id)
 
+class Track(db.Model): # model for the stored metadata of every song that has been favourited or voted for
+    track_id = db.Column(db.Integer, primary_key=True, autoincrement=False) # the TheAudioDB idTrack
+    song_name = db.Column(db.String(64))
+    artist_name = db.Column(db.String(64))
+
+    # what the templates show, copied from the api so pages render without calling it
+    album = db.Column(db.String(128))
+    genre = db.Column(db.String(64))
+    thumb_url = db.Column(db.String(256))
+    music_video = db.Column(db.String(256))
+    refreshed_at = db.Column(db.DateTime, index=True) # none until the metadata has been fetched
+
+    def __repr__(self): # returns a string representation of the track
+        return '<Track {}>'.format(self.song_name)
+
+
+class CatalogTrack(db.Model): # model for every track the api has returned, searched locally before calling it again
+    # exact spellings are looked up by their normalized keys, close ones through the catalog_search fts table
+    __table_args__ = (
+        db.Index('ix_catalog_track_keys', 'artist_key', 'song_key'),
+    )
+
+    track_id = db.Column(db.Integer, primary_key=True, autoincrement=False) # the TheAudioDB idTrack
+    song_name = db.Column(db.String(256))
+    artist_name = db.Column(db.String(256))
+    album = db.Column(db.String(256))
+    song_key = db.Column(db.String(256)) # trimmed and case folded names
+    artist_key = db.Column(db.String(256))
+    payload = db.Column(db.Text) # the track as json, exactly as the api returned it
+    seen_at = db.Column(db.DateTime)
+
+    def __repr__(self): # returns a string representation of the catalog track
+        return '<CatalogTrack {}>'.format(self.song_name)
+
+
+class VoteTally(db.Model): # model for the running vote count of each song in an event
+    # one row per song per event, the ranking index covers the whole leaderboard read
+    __table_args__ = (
+        db.UniqueConstraint('event_id', 'track_id', name='uq_vote_tally_event_track'),
+        db.Index('ix_vote_tally_ranking', 'event_id', 'votes', 'track_id', 'song_name', 'artist_name'),
+    )
+
+    # information about the song tally
+    tally_id = db.Column(db.Integer, primary_key=True)
+    track_id = db.Column(db.Integer)
+    song_name = db.Column(db.String(64))
+    artist_name = db.Column(db.String(64))
+    votes = db.Column(db.Integer, nullable=False, default=0)
+    last_voted_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+    # information with foreign keys
+    event_id = db.Column(db.Integer, db.ForeignKey('events.event_id', name='vote_tally_event_id'), nullable=False)
+
+    # relationships to other tables
+    event = db.relationship('Events', back_populates='vote_tallies')
+
+    def __repr__(self): # returns a string representation of the vote tally
+        return '<VoteTally {} {}>'.format(self.track_id, self.votes)
+
+    def get_id(self): # returns the vote tally id as a string
+        return str(self.tally_id)
+
 class SongReviews(db.Model): # model for the song reviews table
+    # reviews are listed per song in the order they were written
+    __table_args__ = (
+        db.Index('ix_song_reviews_song', 'reviewsong_id', 'review_id'),
+    )
+
     # information about the song review
     review_id = db.Column(db.Integer, primary_key=True, unique=True)
-    review = db.Column(db.String(140), index=True)
-    reviewsong_id = db.Column(db.Integer, index=True)
+    review = db.Column(db.String(140))
+    reviewsong_id = db.Column(db.Integer)
 
     # information with foreign keys
     user_id = db.Column(db.Integer, db.ForeignKey('user.user_id', name='song_reviews_user_id'))
-    username = db.Column(db.String(64), db.ForeignKey('user.username', name='song_reviews_username'))
 
     # relationships to other tables
-    user = db.relationship('User', back_populates='song_reviews', foreign_keys=user_id)
-    username_rel = db.relationship('User', back_populates='song_reviews', foreign_keys=username)
+    user = db.relationship('User', back_populates='song_reviews')
 
     def __repr__(self): # returns a string representation of the song review
         return '<SongReviews {}>'.format(self.review_id)
@@ -142,6 +248,62 @@ class SongReviews(db.Model): # model for the song reviews table
         return str(self.review_id)
 
 
-@login.user_loader # loads the user
-def load_user(user_id):
-    return User.query.get(int(user_id)) # returns the user id as an integer
\ No newline at end of file
+class ArchivedEvent(db.Model): # model for the history of an event that has ended
+    # information about the ended event, kept without foreign keys so deleting the event keeps its history
+    archive_id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, index=True)
+    owner_id = db.Column(db.Integer, index=True)
+    event_name = db.Column(db.String(64))
+    event_code = db.Column(db.Integer)
+    ended_at = db.Column(db.DateTime, index=True, default=datetime.datetime.utcnow)
+
+    # relationships to other tables
+    members = db.relationship('ArchivedEventMember', back_populates='archived_event')
+    votes = db.relationship('ArchivedEventVote', back_populates='archived_event')
+
+    def __repr__(self): # returns a string representation of the archived event
+        return '<ArchivedEvent {}>'.format(self.event_name)
+
+    def get_id(self): # returns the archive id as a string
+        return str(self.archive_id)
+
+class ArchivedEventMember(db.Model): # model for the users that were in an ended event
+    __table_args__ = (
+        db.Index('ix_archived_event_member_user', 'user_id', 'archive_id'),
+    )
+
+    # information about the member
+    archived_member_id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer)
+    username = db.Column(db.String(64))
+    is_admin = db.Column(db.Boolean, default=False)
+    is_dj = db.Column(db.Boolean, default=False)
+
+    # information with foreign keys
+    archive_id = db.Column(db.Integer, db.ForeignKey('archived_event.archive_id', name='archived_event_member_archive_id'),
+                           index=True, nullable=False)
+
+    # relationships to other tables
+    archived_event = db.relationship('ArchivedEvent', back_populates='members')
+
+    def __repr__(self): # returns a string representation of the archived member
+        return '<ArchivedEventMember {}>'.format(self.username)
+
+class ArchivedEventVote(db.Model): # model for the votes cast in an ended event
+    # information about the vote
+    archived_vote_id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer)
+    track_id = db.Column(db.Integer)
+    song_name = db.Column(db.String(64))
+    artist_name = db.Column(db.String(64))
+
+    # information with foreign keys
+    archive_id = db.Column(db.Integer, db.ForeignKey('archived_event.archive_id', name='archived_event_vote_archive_id'),
+                           index=True, nullable=False)
+
+    # relationships to other tables
+    archived_event = db.relationship('ArchivedEvent', back_populates='votes')
+
+    def __repr__(self): # returns a string representation of the archived vote
+        return '<ArchivedEventVote {}>'.format(self.song_name)
+
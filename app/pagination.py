@@ -0,0 +1,22 @@
+from flask import current_app, request
+
+
+def page_args(): # reads the cursor and page size from the query string, capping the size
+    after = request.args.get('after', type=int)
+    limit = request.args.get('limit', default=current_app.config['PAGE_SIZE'], type=int)
+    return after, max(1, min(limit, current_app.config['MAX_PAGE_SIZE']))
+
+
+def keyset_query(query, key_column, after=None, limit=25, descending=False): # the query for one page after a cursor
+    if after is not None: # continues from the last row of the previous page instead of counting an offset
+        query = query.filter(key_column < after if descending else key_column > after)
+    return query.order_by(key_column.desc() if descending else key_column).limit(limit + 1)
+
+
+def keyset_page(query, key_column, after=None, limit=25, descending=False): # gets one page of rows after a cursor
+    rows = keyset_query(query, key_column, after, limit, descending).all()
+
+    # one extra row is read to find out if there is another page
+    items = rows[:limit]
+    next_cursor = getattr(items[-1], key_column.key) if len(rows) > limit else None
+    return items, next_cursor
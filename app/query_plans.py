@@ -0,0 +1,58 @@
+import datetime
+from app import db
+from app import archive, catalog, reviews, routes, user_search, votebuffer
+from app.models import EventUsers, FavouriteSong, VotedSongs, Events
+from app.pagination import keyset_query
+
+
+def route_queries(): # the statements the busiest routes send, built by the same functions with example parameters
+    cutoff = datetime.datetime(2000, 1, 1)
+    queries = [
+        ('index', 'most recent favourite', routes.recent_favourite_query(1).limit(1).statement),
+        ('user', 'events the user is in', db.select(EventUsers).where(EventUsers.user_id == 1)),
+        ('user', 'recent past events', archive.user_history_query(1, limit=5).statement),
+        ('my_favourites', 'favourites in order',
+         keyset_query(FavouriteSong.query.filter_by(user_id=1), FavouriteSong.song_id, after=1).statement),
+        ('favourite_song', 'is the song a favourite', routes.favourite_query(1, 1).limit(1).statement),
+        ('find_users', 'usernames starting with a prefix', user_search.search_query('ab', '5:abc')),
+        ('vote_song', 'songs the guest has voted for', votebuffer.voted_query(1, 1)),
+        ('vote_song', 'buffered votes from guests still in the event', votebuffer.insert_votes_query(
+            [dict(event_id=1, user_id=user_id, track_id=1, song_name='', artist_name='') for user_id in (1, 2)])),
+        ('event', 'members with usernames', routes.event_members_query(1).statement),
+        ('event', 'leaderboard', routes.event_songs_query(1).statement),
+        ('event_api', 'event version', db.select(Events.version, Events.user_id).where(Events.event_id == 1)),
+        ('event_history', 'past runs of the event', archive.event_history_query(1, 1).statement),
+        ('leave_event', 'remove the membership',
+         db.delete(EventUsers).where(EventUsers.user_id == 1, EventUsers.event_id == 1)),
+        ('event_status', 'remove the event votes', db.delete(VotedSongs).where(VotedSongs.event_id == 1)),
+        ('event_status', 'remove the event members', db.delete(EventUsers).where(EventUsers.event_id == 1)),
+        ('search', 'catalog track with the exact spelling', catalog.find_query('song', 'artist', cutoff).limit(1).statement),
+        ('search', 'favourited track ids', routes.favourite_track_ids_query(1).statement),
+        ('search', 'reviews for the song',
+         keyset_query(reviews.reviews_query(1), reviews.SongReviews.review_id, limit=25).statement),
+        ('search', 'review count', reviews.review_count_query(1).statement),
+    ]
+    if catalog.has_search_table():
+        queries += [('search', 'catalog full text search', catalog.search_statement(catalog.trigrams('song'))),
+                    ('search', 'catalog tracks found by full text',
+                     catalog.candidates_query(cutoff, track_ids=[1, 2]).statement)]
+    else:
+        queries.append(('search', 'catalog tracks by artist prefix',
+                        catalog.candidates_query(cutoff, artist_key='artist').statement))
+    return queries
+
+
+def explain(statement): # returns the sqlite query plan of a statement
+    compiled = statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    rows = db.session.execute(db.text('EXPLAIN QUERY PLAN ' + str(compiled))).all()
+    return [row[-1] for row in rows]
+
+
+def is_full_scan(step): # a scan of a whole table, rather than a search through an index or of a list of values
+    # the rows a statement brings with it in a VALUES cte are scanned too, but they are not a table
+    return step.startswith('SCAN') and 'INDEX' not in step and 'CONSTANT ROW' not in step \
+        and step.split()[1] in db.metadata.tables
+
+
+def needs_sort(step): # rows sorted after they are read because no index gives the order
+    return step.startswith('USE TEMP B-TREE')
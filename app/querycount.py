@@ -0,0 +1,42 @@
+import time
+from functools import wraps
+from flask import g, current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+@event.listens_for(Engine, 'before_cursor_execute') # counts every sql statement sent during a request
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context():
+        g.query_count = g.get('query_count', 0) + 1
+    # kept on the statement's own context, which is dropped with it if the statement fails
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute') # adds up the time a request spends waiting on the database
+def time_query(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_start', None)
+    if started is not None and has_app_context():
+        g.query_seconds = g.get('query_seconds', 0) + time.perf_counter() - started
+
+
+class QueryBudgetExceeded(AssertionError): # raised rather than asserted, so python -O doesn't skip the check
+    pass
+
+
+def query_budget(limit): # fails a view that runs more than limit queries, checked in debug and testing
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not (current_app.config['QUERY_BUDGET_CHECKS'] or current_app.debug or current_app.testing):
+                return view(*args, **kwargs)
+
+            start = g.get('query_count', 0)
+            response = view(*args, **kwargs)
+            used = g.get('query_count', 0) - start
+            if used > limit:
+                raise QueryBudgetExceeded(f'{view.__name__} ran {used} queries, its budget is {limit}')
+            return response
+        return wrapper
+    return decorator
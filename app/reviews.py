@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy.orm import joinedload
+from app import app, db
+from app.models import SongReviews, User
+from app.pagination import keyset_page
+
+
+class ReviewCache: # per worker cache of the first page of each songs reviews and how many it has
+
+    def __init__(self, max_entries=1024, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl # seconds another worker's new or deleted review can take to show up here
+        self.pages = OrderedDict() # track_id -> (stored_at, reviews, next_cursor, count), least recently used first
+        self.lock = threading.Lock()
+
+    def get(self, track_id):
+        with self.lock:
+            entry = self.pages.get(track_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl:
+                del self.pages[track_id]
+                return None
+            self.pages.move_to_end(track_id)
+            return entry[1:]
+
+    def put(self, track_id, reviews, next_cursor, count):
+        with self.lock:
+            self.pages[track_id] = (time.monotonic(), reviews, next_cursor, count)
+            self.pages.move_to_end(track_id)
+            while len(self.pages) > self.max_entries:
+                self.pages.popitem(last=False)
+
+    def discard(self, track_id): # called when a review is added or deleted
+        with self.lock:
+            self.pages.pop(track_id, None)
+
+
+review_cache = ReviewCache(app.config['REVIEW_CACHE_SIZE'], app.config['REVIEW_CACHE_TTL'])
+
+
+def reviews_query(track_id): # a songs reviews, with the writer joined by id so renaming a user doesn't lose them
+    return SongReviews.query.filter_by(reviewsong_id=track_id) \
+        .options(joinedload(SongReviews.user).load_only(User.user_id, User.username))
+
+
+def review_count_query(track_id):
+    return db.session.query(db.func.count(SongReviews.review_id)).filter_by(reviewsong_id=track_id)
+
+
+def review_page(track_id, after=None, limit=None): # one page of a songs reviews, oldest first, with who wrote them
+    reviews, next_cursor = keyset_page(reviews_query(track_id), SongReviews.review_id, after,
+                                       limit or app.config['PAGE_SIZE'])
+    # plain dicts, so they can be kept in the cache after the session is gone
+    return [{'review_id': review.review_id, 'review': review.review, 'user_id': review.user_id,
+             'username': review.user.username if review.user else None} for review in reviews], next_cursor
+
+
+def first_review_page(track_id): # the first page and the review count, from the cache when possible
+    cached = review_cache.get(track_id)
+    if cached is not None:
+        return cached
+    reviews, next_cursor = review_page(track_id)
+    if next_cursor is None: # the whole list fits on one page, no need to count it
+        count = len(reviews)
+    else:
+        count = review_count_query(track_id).scalar()
+    review_cache.put(track_id, reviews, next_cursor, count)
+    return reviews, next_cursor, count
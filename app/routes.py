@@ -1,27 +1,95 @@
-from flask import render_template, flash, redirect, url_for
-from app import app, db
+from flask import render_template, flash, redirect, url_for, abort, Response, stream_with_context, jsonify
+from app import app, db, song_cache, audiodb, audiodb_async, broadcaster, background, asset_manifest, metrics
+from app.audiodb import AudioDBError
 from app.forms import LoginForm, EditProfileForm, RegistrationForm, CreateEventForm
 from app.forms import FavouriteSongForm, JoinEventForm, VoteSongForm, SongReviewForm, UploadPfpForm, SearchUsersForm
 from flask_login import current_user, login_user, logout_user, login_required
-from app.models import User, Events, FavouriteSong, EventUsers, VotedSongs, SongReviews
-from flask import request
+from app.models import User, Events, FavouriteSong, EventUsers, VotedSongs, SongReviews, VoteTally, normalize_username
+from app import tallies
+from app.teardown import teardown_event
+from app.votebuffer import vote_buffer
+from app import archive
+from app.querycount import query_budget
+from app import membership
+from app.membership import current_membership
+from app.pagination import page_args, keyset_page
+from app import uploads
+from app import tracks
+from app import catalog
+from app.autocomplete import song_index
+from app import user_search
+from app import event_versions
+from app import upserts
+from app.reviews import review_cache, review_page, first_review_page
+from flask import request, send_from_directory, g, before_render_template, template_rendered, has_request_context
 from werkzeug.urls import url_parse
+import time
+from sqlalchemy.exc import IntegrityError
 from werkzeug.utils import secure_filename
-import requests
-import os
-import datetime
 
 
 @app.context_processor # injects the current event the user is in into all templates
 def inject_user_event():
-    if current_user.is_authenticated: # checks if the user is logged in
-        if current_user.in_event: # checks if the user is in an event
-            user_id = current_user.user_id
-            user_event = EventUsers.query.filter_by(user_id=user_id).first().event_id
-            return dict(user_event=user_event) # returns the event that the user is in
-        else:
-            return dict(user_event=None) # returns the user event as none if the user is not in an event
-    return dict(user_event=None) # returns the user event as none if the user is not logged in
+    user_membership = current_membership() # none if the user is logged out or not in an event
+    if user_membership:
+        return dict(user_event=user_membership.event_id) # returns the event that the user is in
+    return dict(user_event=None) # returns the user event as none if the user is not in an event
+
+
+@app.before_request # starts the clock for the request metrics
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request # records how long the request took and how much of that was sql
+def record_request_metrics(response):
+    if 'request_start' in g:
+        metrics.observe_request(request.endpoint or 'not_found', request.method, response.status_code,
+                                time.perf_counter() - g.request_start, g.get('query_count', 0),
+                                g.get('query_seconds', 0))
+    return response
+
+
+def start_template_timer(sender, template, context, **extra):
+    g.setdefault('template_starts', []).append(time.perf_counter())
+
+
+def record_template_metrics(sender, template, context, **extra): # templates can include others, so starts are a stack
+    starts = g.get('template_starts')
+    if starts:
+        metrics.observe_template(template.name or 'string', time.perf_counter() - starts.pop())
+
+
+before_render_template.connect(start_template_timer, app)
+template_rendered.connect(record_template_metrics, app)
+
+
+def song_cache_metrics(): # the song cache's own counters, read when metrics are scraped
+    stats = song_cache.stats()
+    lines = ['# HELP song_cache_lookups_total Song cache lookups by result.', '# TYPE song_cache_lookups_total counter']
+    for result, count in sorted(stats.items()):
+        if result != 'memory_entries':
+            lines.append(f'song_cache_lookups_total{{result="{result}"}} {count}')
+    lines += ['# HELP song_cache_memory_entries Songs held in this worker\'s memory tier.',
+              '# TYPE song_cache_memory_entries gauge', f'song_cache_memory_entries {stats["memory_entries"]}']
+    return lines
+
+
+metrics.collectors.append(song_cache_metrics)
+
+
+@app.route('/metrics') # request, sql, api and template metrics for prometheus to scrape
+def metrics_endpoint():
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        abort(403)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.url_defaults # points static urls at the fingerprinted copies once the assets have been built
+def fingerprint_static(endpoint, values):
+    if endpoint == 'static' and values.get('filename') in asset_manifest:
+        values['filename'] = asset_manifest[values['filename']]
 
 
 @app.route('/') # displays the home page template
@@ -29,13 +97,14 @@ def inject_user_event():
 @login_required
 def index():
     user_id = current_user.user_id # gets the user id of the current user
-    if current_user.in_event == 1: # checks if the current user is in an event
+    user_membership = current_membership()
+    if user_membership: # checks if the current user is in an event
         status = True
 
         # gets information about the event the user is in
-        event_id = EventUsers.query.filter_by(user_id=user_id).first().event_id
-        event_name = Events.query.filter_by(event_id=event_id).first().event_name
-        event_code = Events.query.filter_by(event_id=event_id).first().event_code
+        user_event = Events.query.filter_by(event_id=user_membership.event_id).first()
+        event_name = user_event.event_name
+        event_code = user_event.event_code
     else:
         status = False
 
@@ -43,14 +112,15 @@ def index():
         event_name = None
         event_code = None
 
-    #gets the most recent addition to the users favourites
-    recent_fave = FavouriteSong.query.filter_by(user_id=user_id).order_by(FavouriteSong.song_id.desc()).first()
+    #gets the most recent addition to the users favourites, with the song information stored when it was added
+    recent_fave = recent_favourite_query(user_id).first()
 
-    #gets the song information for the most recent addition to the users favourites
     if recent_fave:
         fave_name = recent_fave.song_name
         fave_artist = recent_fave.artist_name
-        song = search_songs(fave_name, fave_artist)
+        song = recent_fave.track
+        if song is not None and tracks.is_stale(song): # updates the stored information without waiting for it
+            tracks.refresh_later([song.track_id])
     else: # handles the scenario of the user having no favourites
         fave_name = None
         fave_artist = None
@@ -106,11 +176,29 @@ def register():
 def user(username):
     user = User.query.filter_by(username=username).first_or_404() # gets the user from the database
     event_users = EventUsers.query.filter_by(user_id=user.user_id).all() # gets the events the user is in
-    if user == current_user: # checks if the user is the current user
-        favourites = my_favourites() # gets the current users favourites
+    if user == current_user: # the current user sees links to their own favourites instead
+        favourites, next_cursor = None, None
     else: # if the user is not the current user
-        favourites = user_favourites(user.user_id) # gets the users favourites
-    return render_template('user.html', user=user, event_users=event_users, favourites=favourites)
+        favourites, next_cursor = user_favourites(user.user_id) # gets the first page of the users favourites
+    past_events = archive.user_history(user.user_id, limit=5) # gets the users most recent past events
+    return render_template('user.html', user=user, event_users=event_users, favourites=favourites,
+                           next_cursor=next_cursor, past_events=past_events)
+
+
+@app.route('/user/<username>/favourites') # gets the next page of a users favourites for their profile
+@login_required
+def user_favourites_more(username):
+    user = User.query.filter_by(username=username).first_or_404()
+    after, limit = page_args()
+    songs, next_cursor = user_favourites(user.user_id, after, limit)
+    return render_page_fragment('_favourite_rows.html', next_cursor, songs=songs)
+
+
+def render_page_fragment(template, next_cursor, **context): # renders the rows of a page, with the cursor of the next one
+    response = app.make_response(render_template(template, **context))
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+    return response
 
 
 @app.route('/edit_profile', methods=['GET', 'POST']) # edit profile page
@@ -120,6 +208,7 @@ def edit_profile(): # edit profile function
     if form.validate_on_submit(): # checks if the form validates when submitted
         current_user.username = form.username.data # sets the username to the form data
         current_user.about_me = form.about_me.data # sets the about me to the form data
+        current_user.bump_version() # makes every worker reload the user
         db.session.commit() # commits to database
         flash('Your changes have been saved.')
         return redirect(url_for('user', username=current_user.username)) # redirects to the users profile page
@@ -139,12 +228,22 @@ def upload_pfp():
     form = UploadPfpForm() # sets form as the UploadPfpForm from forms.py
 
     if form.validate_on_submit(): # checks if the form validates when submitted
-        if current_user.pfp:
-            os.remove('app/static/uploads/' + current_user.pfp) # removes the old profile picture from the program files
-        file_name = secure_filename(form.pfp.data.filename) # sets the file name to the secure filename
-        form.pfp.data.save('app/static/uploads/' + file_name) # saves the file to the program files
+        folder = app.config['UPLOAD_FOLDER']
+        try: # saves the picture under the hash of its contents
+            file_name = uploads.save_pfp(form.pfp.data, folder, app.config['MAX_PFP_BYTES'])
+        except uploads.UploadError as error:
+            flash(str(error))
+            return redirect(url_for('upload_pfp'))
+        background.submit(uploads.make_thumbnails, file_name, folder) # resizes the picture off the request thread
+
+        old_pfp = current_user.pfp
         current_user.pfp = file_name # adds the name of the file to the user database entry
+        current_user.bump_version() # makes every worker reload the user
         db.session.commit() # commits to database
+
+        # removes the old profile picture from the program files, unless someone else uses the same picture
+        if old_pfp and old_pfp != file_name and not User.query.filter_by(pfp=old_pfp).first():
+            uploads.remove_pfp(old_pfp, folder)
         flash('Your profile picture has been updated.')
         return redirect(url_for('user', username=current_user.username))
 
@@ -153,6 +252,29 @@ def upload_pfp():
                            form=form)
 
 
+@app.errorhandler(413) # handles uploads bigger than MAX_CONTENT_LENGTH
+def upload_too_large(error):
+    flash(f'Profile pictures must be smaller than {app.config["MAX_PFP_BYTES"] // (1024 * 1024)} MB.')
+    return redirect(url_for('upload_pfp'))
+
+
+@app.route('/pfp/<int:size>/<file_name>') # serves a profile picture thumbnail
+def pfp(size, file_name):
+    if size not in uploads.THUMBNAIL_SIZES:
+        abort(404)
+    folder = app.config['UPLOAD_FOLDER']
+    thumbnail = uploads.find_thumbnail(file_name, folder, size, 'image/webp' in request.accept_mimetypes)
+
+    if thumbnail: # thumbnails are named after their contents, so browsers can keep them forever
+        response = send_from_directory(folder, thumbnail, max_age=app.config['PFP_CACHE_SECONDS'])
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    else: # the thumbnails are still being made, or the picture is from before they existed
+        response = send_from_directory(folder, file_name, max_age=60)
+    response.vary.add('Accept')
+    return response
+
+
 @app.route('/search_users', methods=['GET', 'POST']) # search users page
 @login_required
 def search_users():
@@ -160,6 +282,9 @@ def search_users():
     user = form.username.data # sets user as the username searched in the form
     if user:
         found_user = User.query.filter_by(username=user).first() # gets the user from the database
+        if found_user is None: # the same name typed in a different case
+            found_user = User.query.filter_by(username_normalized=normalize_username(user)) \
+                .order_by(User.user_id).first()
         if found_user: # checks if the username exists
             username = found_user.username # sets username as the found users username
             return redirect(url_for('user', username=username))
@@ -170,6 +295,21 @@ def search_users():
     return render_template('search_users.html', title='Search Users', form=form)
 
 
+@app.route('/users/search') # finds users whose name starts with what has been typed, a page at a time
+@login_required
+def find_users():
+    _, limit = page_args()
+    users, next_cursor = user_search.find_users(request.args.get('q', ''), request.args.get('cursor'), limit)
+    response = jsonify(users=[{
+        'username': user.username,
+        'url': url_for('user', username=user.username),
+        'pfp': url_for('pfp', size=64, file_name=user.pfp) if user.pfp else url_for('static', filename='images/defaultpfp.png'),
+    } for user in users], next_cursor=next_cursor)
+    response.cache_control.private = True
+    response.cache_control.max_age = 30 # typing back over a name is answered by the browser
+    return response
+
+
 ### EVENT HANDLING ###
 
 @app.route('/create_event', methods=['GET', 'POST']) # create event page
@@ -182,7 +322,6 @@ def create_event():
     if form.validate_on_submit():
         # creates a new event from the form data
         dj = form.dj.data
-        print(dj)
         search_dj = User.query.filter_by(username=dj).first()
         if search_dj:
             if search_dj.user_id == user_id:
@@ -190,7 +329,6 @@ def create_event():
                 return redirect(url_for('create_event'))
             else:
                 dj_id = search_dj.user_id
-                print(dj_id)
         else:
             flash('DJ not found')
             return redirect(url_for('create_event'))
@@ -204,36 +342,19 @@ def create_event():
         return redirect(url_for('index'))
     return render_template('create_event.html', title='Create Event', form=form)
 
-def get_event_songs(event_id): # gets the songs in an event
-    user_id = current_user.user_id # gets the current user's id
-    event_id = EventUsers.query.filter_by(user_id=user_id).first().event_id # gets the event user is in
-    event_songs = VotedSongs.query.filter_by(event_id=event_id).all()  # gets songs in the users event
-
-    unique_songs = set() # creates a set to store unique songs
-
-    filtered_songs = [] # creates a list to store the songs
+def event_songs_query(event_id, limit=None):
+    # reads the running tallies, which the ranking index covers, instead of recounting every vote
+    event_songs = db.session.query(VoteTally.song_name, VoteTally.artist_name, VoteTally.votes) \
+        .filter(VoteTally.event_id == event_id) \
+        .order_by(VoteTally.votes.desc(), VoteTally.track_id.desc())
 
-    for song in event_songs: # loops through all songs found from the database
-        current_song = (song.track_id, song.event_id) # sets track id and event id of the current song
-        if current_song not in unique_songs: # checks if the song is in the set of unique songs
-            unique_songs.add(current_song) # adds the song to the set of unique songs
-            song_votes = vote_counter(song.track_id, event_id) # gets song votes using the vote_counter function
+    if limit: # only returns the top songs when a limit is given
+        event_songs = event_songs.limit(limit)
+    return event_songs
 
-            song_with_votes = { # creates a dictionary with the song name, artist name and votes
-                'song_name': song.song_name,
-                'artist_name': song.artist_name,
-                'votes': song_votes
-            }
-            filtered_songs.append(song_with_votes) # adds the song_with_votes entry to filter_songs
 
-    sorted_songs = sorted(filtered_songs, key=lambda k: k['votes'], reverse=True) # sorts the songs by votes in descending order
-
-    return sorted_songs # returns the sorted songs
-
-
-def vote_counter(track_id, event_id): # counts the votes for a song
-    # counts the number of times a song entry appears in a single event
-    return VotedSongs.query.filter_by(track_id=track_id, event_id=event_id).count()
+def get_event_songs(event_id, limit=None): # gets the songs in an event ranked by their votes
+    return [song._asdict() for song in event_songs_query(event_id, limit)] # returns the songs sorted by votes in descending order
 
 
 @app.route('/my_events', methods=['GET', 'POST']) # gets the events a user has created
@@ -249,45 +370,15 @@ def my_events():
 def event_status(event_id):
     event = Events.query.get_or_404(event_id) # gets the event from the database
     user_id = current_user.user_id # gets the current user's id
-    user_active = User.query.get(user_id).in_event # gets whether the user is in an event
+    user_active = current_user.in_event # gets whether the user is in an event
     if event: # checks if the event exists
 
         if event.active_status == 1: # checks if the event is active
 
-            f = open('app/static/history/' + event.event_name + '.txt', 'a')  # opens a file to store the event history
-            f.write('Event History for ' + event.event_name + '\n \n') # writes the event name to the file
-            f.write('Date: ' + str(datetime.datetime.now()) + '\n \n') # writes the date to the file
-            f.write('All Users' + '\n' + '---' + '\n') # writes all songs to the file
-
-            event.active_status = 0 # sets the event to inactive
-
-            all_users = EventUsers.query.filter_by(event_id=event_id).all() # gets all users in the event
-
-            user_ids = [] # creates a list to store the user ids
-            for user in all_users: # loops through all users in the event
-
-                username = User.query.get(user.user_id).username # gets the username of the user
-                f.write(username + '\n') # writes the username to the file
-
-                user_in_event = User.query.get(user.user_id) # check if this is actually necessary
-                user_in_event.in_event = 0 # sets the user to not in an event
-                user_ids.append(user.user_id) # adds the user id to the list of user ids
-                db.session.delete(user) # removes user from the event database
-                db.session.commit() # commits to database
-
-            f.write('\nAll Songs' + '\n'+ '---' + '\n') # writes all songs to the file
-
-            event_songs = VotedSongs.query.filter_by(event_id=event_id).all() # gets all voted songs in the event
-            for song in event_songs: # loops through all songs in the event
-                f.write(song.song_name + ' by ' + song.artist_name + '\n') # writes the song name and artist name to the file
-
-                db.session.delete(song) # removes song from the event database
-                db.session.commit() # commits to database
-
-            f.write('\n \n')
-            f.close() # closes the file
-
-            flash(f'{event.event_name} has been deactivated')
+            event_name = event.event_name
+            # archives the event history, then ends the event and removes its users and songs
+            removed_users, removed_votes = teardown_event(event_id, archive=True)
+            flash(f'{event_name} has been deactivated. {removed_users} users and {removed_votes} votes were removed')
 
         else:
             if user_active == 1: # checks if the user is in an event
@@ -295,11 +386,12 @@ def event_status(event_id):
                 return redirect(url_for('my_events'))
             else:
                 event.active_status = 1 # sets the event to active
-                current_user.in_event = 1 # sets the user to in an event
                 user_id = current_user.user_id # gets the current user's id
                 event_id = event.event_id # gets the event id
+                membership.join_event(current_user, event_id, 'admin') # sets the user to in an event
                 event_user = EventUsers(event_id=event_id, user_id=user_id, is_admin=True) # adds the user to the event
                 db.session.add(event_user) # adds the user to the event database
+                event_versions.bump(event_id)
                 db.session.commit() # commits to database
                 flash(f'{event.event_name} has been activated')
 
@@ -307,6 +399,24 @@ def event_status(event_id):
     return redirect(url_for('my_events'))
 
 
+@app.route('/event_history/<int:event_id>') # downloads the history of an event the user created
+@login_required
+def event_history(event_id):
+    archives = archive.event_history(event_id, current_user.user_id) # gets every past run of the event
+    if not archives: # handles events that have never ended, or that belong to someone else
+        flash('This event has no history yet')
+        return redirect(url_for('my_events'))
+
+    # exports the history as text, or as json when asked for
+    if request.args.get('format') == 'json':
+        body, mimetype, extension = archive.export_json(archives), 'application/json', 'json'
+    else:
+        body, mimetype, extension = archive.export_text(archives), 'text/plain', 'txt'
+    file_name = secure_filename(archives[0].event_name) or 'event'
+    return Response(body, mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={file_name}.{extension}'})
+
+
 @app.route('/join_event', methods=['GET', 'POST']) # allows a user to join an event
 @login_required
 def join_event():
@@ -321,15 +431,19 @@ def join_event():
 
                 if user_id == event.dj_id: # checks if the user is the dj
                     joining_user = EventUsers(event_id=event_id, user_id=user_id, is_dj=True) # adds the user to the event as a dj
+                    role = 'dj'
                 else:
                     joining_user = EventUsers(event_id=event_id, user_id=user_id) # adds the user to the event
+                    role = 'guest'
 
-                current_user.in_event = 1 # sets the user to in an event
+                membership.join_event(current_user, event_id, role) # sets the user to in an event
                 db.session.add(joining_user)
+                event_versions.bump(event_id) # polling screens pick up the new member
                 db.session.commit()
+                publish_event_update(event_id)
 
                 # flashes a message to the user
-                event_name = Events.query.get(event_id).event_name
+                event_name = event.event_name
                 flash(f'You have joined {event_name}')
                 return redirect(url_for('event', event_id=event_id))
             else: # if the event doesn't exist OR if the event is not active
@@ -344,36 +458,23 @@ def join_event():
 @app.route('/leave_event', methods=['GET', 'POST']) # allows a user to leave an event
 @login_required
 def leave_event():
-    admin_status = EventUsers.query.filter_by(user_id=current_user.user_id).first().is_admin # checks if the user is th event admin
-    event_id = EventUsers.query.filter_by(user_id=current_user.user_id).first().event_id # gets the event id
-    if current_user.in_event == 1: # checks if the user is in an event
-        current_user.in_event = 0 # sets the user to not in an event
-        EventUsers.query.filter_by(user_id=current_user.user_id).delete() # removes the user from the event database
-        db.session.commit()
-        flash('You have left the event')
-
-        # ensures that when the admin leaves the event is ended and all uers and songs are removed
-        if admin_status == 1: # checks if the user is the event admin
-            all_users = EventUsers.query.filter_by(event_id=event_id).all() # gets all users in the event
-            event_status = Events.query.get_or_404(event_id).active_status # gets the event status
-            if event_status == 1: # checks if the event is active
-                Events.query.get_or_404(event_id).active_status = 0 # sets the event to inactive
-                db.session.commit()
-            user_ids = [] # creates a list to store the user ids
-            for user in all_users: # loops through all users in the event
-                user_in_event = User.query.get(user.user_id)
-                user_in_event.in_event = 0
-                user_ids.append(user.user_id)
-                db.session.delete(user) # removes user from the event database
-                db.session.commit()
-                flash('Admin has left the event. All users have been removed from the event')
-
-            event_songs = VotedSongs.query.filter_by(event_id=event_id).all() # gets all voted songs in the event
-            for song in event_songs: # loops through all songs in the event
-                db.session.delete(song) # removes song from the event database
-                db.session.commit()
-                flash('All songs have been removed from the event')
-
+    user_membership = current_membership() # gets the users place in their event
+    if user_membership: # checks if the user is in an event
+        event_id = user_membership.event_id # gets the event id
+
+        # ensures that when the admin leaves the event is ended and all users and songs are removed
+        if user_membership.is_admin: # checks if the user is the event admin
+            removed_users, removed_votes = teardown_event(event_id, archive=True)
+            flash(f'You have left the event. As the admin left, the event has ended and '
+                  f'{removed_users} users and {removed_votes} votes were removed')
+        else:
+            membership.leave_event(current_user) # sets the user to not in an event
+            EventUsers.query.filter_by(user_id=current_user.user_id, event_id=event_id) \
+                .delete(synchronize_session=False) # removes the user from the event database
+            event_versions.bump(event_id)
+            db.session.commit()
+            publish_event_update(event_id)
+            flash('You have left the event')
 
         return redirect(url_for('user', username=current_user.username))
     else: # handles if the user somehow accesses the leave event button while not being in an event
@@ -381,92 +482,153 @@ def leave_event():
         return redirect(url_for('user', username=current_user.username))
 
 
+def event_members_query(event_id):
+    return db.session.query(EventUsers.user_id, EventUsers.is_admin, EventUsers.is_dj, User.username) \
+        .join(User, User.user_id == EventUsers.user_id) \
+        .filter(EventUsers.event_id == event_id) \
+        .order_by(EventUsers.event_user_id)
+
+
+def get_event_members(event_id): # gets everyone in an event with their usernames in one query
+    return event_members_query(event_id).all()
+
+
 @app.route('/event/<int:event_id>', methods=['GET', 'POST']) # allows a user to view an event
 @login_required
+@query_budget(3) # the event, its members and its songs, however many guests
 def event(event_id):
 
-    # gets all necessary information about the current user, the event, and the songs in the event
-    user_id = current_user.user_id
-    if EventUsers.query.filter_by(user_id=user_id).first(): # checks if the user is in an event
-        user_event = EventUsers.query.filter_by(user_id=user_id).first().event_id
-        event_name = Events.query.filter_by(event_id=user_event).first().event_name
-        event_code = Events.query.filter_by(event_id=user_event).first().event_code
-        event_description = Events.query.filter_by(event_id=user_event).first().event_description
-        event_location = Events.query.filter_by(event_id=user_event).first().event_location
-        users = EventUsers.query.filter_by(event_id=user_event).all()
-        admin = EventUsers.query.filter_by(is_admin=1, event_id=user_event).first()
-        dj = EventUsers.query.filter_by(is_dj=1, event_id=user_event).first()
-        print(dj)
-        event_songs = get_event_songs(user_event)
-
-        # gets the admin username
-        if admin:
-            admin_user = User.query.filter_by(user_id=admin.user_id).first()
-            admin_username = admin_user.username
-
-        if dj:
-            dj_user = User.query.filter_by(user_id=dj.user_id).first()
-            dj_username = dj_user.username
-            print(dj_username)
-        else:
-            dj_username = None
-
-        # gets the usernames of all users in the event
-        users_names = []
-        for user in users:
-            if user.is_admin == 0:
-                user_name = User.query.filter_by(user_id=user.user_id).first().username
-                users_names.append(user_name)
-    else: # handles if the user is not in an event
-        user_event = None
-        event_name = None
-        event_code = None
-        event_description = None
-        event_location = None
-        users = None
-        admin_username = None
-        dj_username = None
-        event_songs = None
-        users_names = None
-        flash('You are not in an event')
+    # handles if the user is not in this event
+    user_membership = current_membership()
+    if not user_membership or user_membership.event_id != event_id:
+        flash('You are not in this event')
         return redirect(url_for('index'))
 
+    # gets the event and all of its members in two queries
+    event = Events.query.filter_by(event_id=event_id).first()
+    members = get_event_members(event_id)
+
+    event_songs = get_event_songs(event_id)
+
+    # gets the usernames of the admin, the dj and all the guests from the members
+    admin_username = None
+    dj_username = None
+    users_names = []
+    for member in members:
+        if member.is_admin:
+            admin_username = member.username
+        else:
+            users_names.append(member.username)
+            if member.is_dj:
+                dj_username = member.username
+
     # injects all necessary information into the template
-    return render_template('event.html', event_id=user_event, user_event=user_event, event_name=event_name, event_code=event_code, users=users, users_names=users_names, admin_username=admin_username, dj_username=dj_username, event_songs=event_songs, event_location=event_location, event_description=event_description)
+    return render_template('event.html', event_id=event_id, user_event=event_id, event_name=event.event_name,
+                           event_code=event.event_code, users=members, users_names=users_names,
+                           admin_username=admin_username, dj_username=dj_username, event_songs=event_songs,
+                           event_location=event.event_location, event_description=event.event_description)
 
 
-@app.route('/delete_event/<int:event_id>', methods=['GET', 'POST']) # allows the admin to delete an event
+def publish_event_update(event_id): # pushes the current songs and guests to everyone watching the event page
+    if broadcaster.subscriber_count(event_id) == 0: # nobody in this process is watching, so nothing to read
+        return
+    broadcaster.publish(event_id, 'update', event_update(event_id))
+
+
+def event_update(event_id): # the songs and guests the event page shows
+    guests = [member.username for member in get_event_members(event_id) if not member.is_admin]
+    return {'songs': get_event_songs(event_id), 'guests': guests}
+
+
+def event_state(event_id): # the version and status of an event, None once it is deleted
+    return db.session.query(Events.version, Events.active_status).filter(Events.event_id == event_id).first()
+
+
+@app.route('/event/<int:event_id>/stream') # streams live updates for the event page
 @login_required
-def delete_event(event_id):
+def event_stream(event_id):
+    user_membership = current_membership()
+    if not user_membership or user_membership.event_id != event_id:
+        abort(403) # only members of the event can watch it
+    seen = event_state(event_id)
+    db.session.close() # gives the database connection back before the long lived stream starts
+
+    def catch_up(): # changes made on another worker bump the event version but are only published in that worker
+        nonlocal seen
+        state = event_state(event_id)
+        try:
+            if state == seen:
+                return None
+            seen = state
+            if state is None or not state.active_status:
+                return 'ended', {}
+            return 'update', event_update(event_id)
+        finally:
+            db.session.close()
+
+    stream = broadcaster.listen(event_id, keepalive=app.config['EVENT_STREAM_KEEPALIVE'], idle=catch_up)
+    return Response(stream_with_context(stream), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def event_api_response(event_id, tag, build): # answers a read-only event api request, or 304 if it has not changed
+    # only the version is read first, so a client that already has the latest copy costs one indexed lookup
+    event = db.session.query(Events.version, Events.user_id).filter(Events.event_id == event_id).first()
+    if event is None:
+        abort(404)
+    user_membership = current_membership()
+    if event.user_id != current_user.user_id and (not user_membership or user_membership.event_id != event_id):
+        abort(403) # only the members and the owner of the event can read it
+
+    etag = f'{tag}-{event_id}-v{event.version}'
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True # the browser keeps its copy but checks it every time
+    return response
 
-    all_users = EventUsers.query.filter_by(event_id=event_id).all() # gets all users in the event
-    event_status = Events.query.get_or_404(event_id).active_status  # gets the event status
-    if event_status == 1:  # checks if the event is active
-        Events.query.get_or_404(event_id).active_status = 0  # sets the event to inactive
-        db.session.commit()
-    user_ids = []  # creates a list to store the user ids
-    for user in all_users:  # loops through all users in the event
-        user_in_event = User.query.get(user.user_id)
-        user_in_event.in_event = 0
-        user_ids.append(user.user_id)
-        db.session.delete(user)  # removes user from the event database
-        db.session.commit()
-        flash('Admin has left the event. All users have been removed from the event')
 
-    event_songs = VotedSongs.query.filter_by(event_id=event_id).all()  # gets all voted songs in the event
-    for song in event_songs:  # loops through all songs in the event
-        db.session.delete(song)  # removes song from the event database
-        db.session.commit()
-        flash('All songs have been removed from the event')
+@app.route('/api/events/<int:event_id>') # the event's details as json
+@login_required
+def event_api(event_id):
+    def build():
+        event = Events.query.filter_by(event_id=event_id).first()
+        return {'event_id': event.event_id, 'event_name': event.event_name, 'active': bool(event.active_status),
+                'event_location': event.event_location, 'event_description': event.event_description,
+                'version': event.version}
+    return event_api_response(event_id, 'event', build)
 
-    delete = Events.query.get_or_404(event_id)  # gets the event to be deleted
-    db.session.delete(delete)  # deletes the event
-    db.session.commit()
-    flash('Event has been deleted')
+
+@app.route('/api/events/<int:event_id>/leaderboard') # the event's songs ranked by their votes as json
+@login_required
+def event_leaderboard_api(event_id):
+    limit = request.args.get('limit', type=int)
+    limit = max(1, min(limit, app.config['MAX_PAGE_SIZE'])) if limit else None
+    return event_api_response(event_id, f'leaderboard-{limit or "all"}',
+                              lambda: {'songs': get_event_songs(event_id, limit)})
 
 
+@app.route('/api/events/<int:event_id>/members') # the event's members and their roles as json
+@login_required
+def event_members_api(event_id):
+    return event_api_response(event_id, 'members', lambda: {'members': [
+        {'username': member.username, 'is_admin': member.is_admin, 'is_dj': member.is_dj}
+        for member in get_event_members(event_id)]})
 
 
+@app.route('/delete_event/<int:event_id>', methods=['GET', 'POST']) # allows the admin to delete an event
+@login_required
+def delete_event(event_id):
+    event = Events.query.get_or_404(event_id) # gets the event to be deleted
+    event_name = event.event_name
+
+    # removes all users and songs from the event and deletes it in one transaction
+    removed_users, removed_votes = teardown_event(event_id, delete=True)
+    flash(f'{event_name} has been deleted. {removed_users} users and {removed_votes} votes were removed')
+
     return redirect(url_for('my_events'))
 
 
@@ -476,16 +638,10 @@ def delete_event(event_id):
 @app.route('/search', methods=['GET', 'POST']) # allows a user to search for a song
 @login_required
 def search():
-    user_id = current_user.user_id # gets the current user id
-
     # handles if the user is the event dj
-    if EventUsers.query.filter_by(user_id=user_id).first(): # checks if the user is in an event
-        is_dj = EventUsers.query.filter_by(user_id=user_id).first().is_dj # checks if the user is a dj
-        print(is_dj)
-        if is_dj == True:
-            dj_status = 1
-        else:
-            dj_status = 0
+    user_membership = current_membership()
+    if user_membership and user_membership.is_dj: # checks if the user is in an event as its dj
+        dj_status = 1
     else:
         dj_status = 0
 
@@ -494,22 +650,12 @@ def search():
         artist_name = request.form['artist'] # gets the artist name from the form
         song = search_songs(song_name, artist_name) # runs search song function using the song and artist names
 
-        if song is not None: # checks if the song exists
-            song_id = song['idTrack'] # gets the song id
-
-            reviews = SongReviews.query.filter_by(reviewsong_id=song_id).all() # gets all reviews for the song
-            all_reviews = [] # creates a list to store all reviews
-
-            for item in reviews: # loops through all reviews
-                username = item.username # gets the username of the reviewer
-                review = item.review # gets the review
-                id = item.review_id # gets the review id
-
-                all_reviews.append({'username': username, 'review': review, 'id': id}) # adds the review to the list
-
-
         if song: # checks if the song exists
-            return render_template('results.html', song=song, song_in_favourites=song_in_favourites, all_reviews=all_reviews, dj_status=dj_status)
+            # gets the first page of reviews for the song and whether it is a favourite before rendering
+            reviews, next_cursor, review_count = first_review_page(int(song['idTrack']))
+            is_favourite = str(song['idTrack']) in favourite_track_ids()
+            return render_template('results.html', song=song, is_favourite=is_favourite, reviews=reviews,
+                                   next_cursor=next_cursor, review_count=review_count, dj_status=dj_status)
 
         else: # if the song does not exist
             flash('Song not found')
@@ -517,20 +663,70 @@ def search():
             return render_template('search.html')
     return render_template('search.html')
 
-def song_in_favourites(track_id):
-    user_id = current_user.user_id # gets the user id
-    # checks if the song is in the database linked to the user id
-    return FavouriteSong.query.filter_by(user_id=user_id, track_id=track_id).first() is not None # checks if the song is in the users favourites
 
-def search_songs(song_name, artist_name): # searches for albums and gets response from api
-    api = '523532' # api key
-    url = f'https://theaudiodb.com/api/v1/json/{api}/searchtrack.php?s={artist_name}&t={song_name}' # url for api
-    response = requests.get(url) # gets response from api
-    get_data = response.json() # converts response to json
-    if 'track' in get_data and get_data['track'] is not None: # checks if the song exists
-        return get_data['track'][0] # returns the song
+@app.route('/autocomplete') # suggests songs as the user types in the search form, without calling the api
+@login_required
+def autocomplete():
+    limit = min(request.args.get('limit', app.config['AUTOCOMPLETE_LIMIT'], type=int), app.config['AUTOCOMPLETE_LIMIT'])
+    suggestions = song_index.suggest(request.args.get('song', ''), request.args.get('artist', ''), max(limit, 1))
+    return jsonify(suggestions=suggestions)
+
+
+@app.route('/reviews/<int:track_id>') # gets the next page of reviews for a song
+@login_required
+def song_reviews(track_id):
+    after, limit = page_args()
+    reviews, next_cursor = review_page(track_id, after, limit)
+    return render_page_fragment('_review_rows.html', next_cursor, reviews=reviews)
+
+
+def favourite_track_ids_query(user_id): # only reads the user's entries of the (user, track) index
+    return db.session.query(FavouriteSong.track_id).filter(FavouriteSong.user_id == user_id)
 
-    return None # returns none if the song does not exist
+
+def favourite_track_ids(): # the track ids the current user has favourited, read at most once per request
+    if '_favourite_track_ids' not in g:
+        g._favourite_track_ids = {str(track_id) for track_id, in favourite_track_ids_query(current_user.user_id)}
+    return g._favourite_track_ids
+
+
+def favourite_query(user_id, track_id): # the users favourite of a song, if they have one
+    return FavouriteSong.query.filter_by(track_id=track_id, user_id=user_id)
+
+def search_songs(song_name, artist_name): # searches for a song, answering from the cache or catalog when possible
+    def fetch(): # a cache miss, tries the local catalog before the api
+        song = catalog.find(song_name, artist_name)
+        if song is not None:
+            return song
+        db.session.commit() # ends the read transaction, so the connection isn't held while the api is waited on
+        try:
+            # waits on the event loop's request instead of holding a connection itself, background refreshes of stale
+            # cache entries have no server loop to run on and use the sync client, rather than a new loop per call
+            if app.config['ASYNC_MODE'] and has_request_context():
+                song = audiodb_async.search_track_from_thread(song_name, artist_name)
+            else:
+                song = audiodb.search_track(song_name, artist_name)
+        except AudioDBError: # answers with a close catalog match while the api is down
+            song = catalog.find_close(song_name, artist_name)
+            if song is None:
+                raise
+            return song
+        if not song: # probably a misspelling of a track the catalog already knows
+            return catalog.find_close(song_name, artist_name)
+
+        catalog.add(song) # remembers the track for every later search
+        try:
+            db.session.commit()
+        except IntegrityError: # another request stored the same track first
+            db.session.rollback()
+        song_index.add(song.get('strTrack'), song.get('strArtist'), weight=0) # suggested from now on
+        return song
+
+    try:
+        return song_cache.get_or_fetch(song_name, artist_name, fetch)
+    except AudioDBError as error: # the api is down or too slow, treated like no result without caching it
+        app.logger.warning(error)
+        return None
 
 
 @app.route('/favourite_song', methods=['GET', 'POST']) # allows a user to favourite a song
@@ -550,15 +746,20 @@ def favourite_song():
         new_song = FavouriteSong(song_name=song_name, artist_name=artist_name, track_id=track_id, user_id=user_id)
 
         # if the song is in the favourites , remove the song from user favourites
-        if FavouriteSong.query.filter_by(track_id=track_id, user_id=user_id).first():
+        song = favourite_query(user_id, track_id).first()
+        if song:
             flash('Song removed from favourites.')
-            song = FavouriteSong.query.filter_by(track_id=track_id, user_id=user_id).first()
             db.session.delete(song)
             db.session.commit()
+            song_index.add(song_name, artist_name, weight=-1)
             return redirect(url_for('search'))
         else: # if the song is not in the favourites, add the song to the users favourites
             db.session.add(new_song)
+            track = tracks.remember(track_id, song_name, artist_name) # stores the song information for later pages
             db.session.commit()
+            if track is not None and tracks.is_stale(track): # the song wasn't cached, fetches it off the request
+                tracks.refresh_later([track.track_id])
+            song_index.add(song_name, artist_name) # ranks the song higher in search suggestions
             flash('Your song has been added to your favourites.')
             return redirect(url_for('search'))
     else: # error handling
@@ -573,7 +774,7 @@ def vote_song():
     # gets relevant information about the user and event the user is in
     form = VoteSongForm()
     user_id = current_user.user_id
-    event_id = EventUsers.query.filter_by(user_id=user_id).first().event_id
+    user_membership = current_membership()
 
     # gets relevant information about the song
     song_name = request.form.get('song_name')
@@ -581,14 +782,31 @@ def vote_song():
     track_id = request.form.get('track_id')
 
     # checks if the user is actually in an event
-    if current_user.in_event:
+    if user_membership:
+        event_id = user_membership.event_id
         # checks if the song has a name and artist
-        if song_name and artist_name:
-            # checks if the song has already been voted for, adds song if n ot
-            if VotedSongs.query.filter_by(track_id=track_id, event_id=event_id, user_id=user_id).first() is None:
-                new_song = VotedSongs(song_name=song_name, artist_name=artist_name, track_id=track_id, event_id=event_id, user_id=user_id)
-                db.session.add(new_song)
+        if song_name and artist_name and app.config['VOTE_BUFFER'] and track_id and track_id.isdigit():
+            # accepts the vote in memory, it is written with the next batch a few milliseconds later
+            if vote_buffer.add(event_id, user_id, current_user.version, int(track_id), song_name, artist_name):
+                song_index.add(song_name, artist_name)
+                flash(f'{song_name} has been upvoted!')
+                return redirect(url_for('search'))
+            flash('You have already voted for this song')
+            return render_template('search.html', title='Vote Song', form=form)
+        elif song_name and artist_name:
+            # adds the vote unless the user has already voted for the song, the unique index decides even when two
+            # requests for the same vote arrive at once
+            new_vote = upserts.insert(VotedSongs).values(song_name=song_name, artist_name=artist_name, track_id=track_id,
+                                                         event_id=event_id, user_id=user_id).on_conflict_do_nothing()
+            if db.session.execute(new_vote).rowcount:
+                tallies.count_vote(event_id, track_id, song_name, artist_name) # updates the tally in the same transaction
+                event_versions.bump(event_id) # polling screens pick up the new ranking
+                track = tracks.remember(track_id, song_name, artist_name) # stores the song information for later pages
                 db.session.commit()
+                if track is not None and tracks.is_stale(track):
+                    tracks.refresh_later([track.track_id])
+                publish_event_update(event_id)
+                song_index.add(song_name, artist_name) # ranks the song higher in search suggestions
                 flash(f'{song_name} has been upvoted!')
                 return redirect(url_for('search'))
             else: # if the song has already been voted for
@@ -606,23 +824,29 @@ def vote_song():
 @app.route('/my_favourites', methods=['GET', 'POST']) # allows a user to view their favourites
 @login_required
 def my_favourites():
-    # gets the current user and all favourited songs linked to the current user
-    user_id = current_user.user_id
-    songs = FavouriteSong.query.filter_by(user_id=user_id).all()
-    return render_template('my_favourites.html', songs=songs)
-def user_favourites(user_id):
-    # gets the user whose profile is being viewed and all their favourites
-    favourites = FavouriteSong.query.filter_by(user_id=user_id)
+    # gets the current user and the first page of favourited songs linked to the current user
+    after, limit = page_args()
+    songs, next_cursor = user_favourites(current_user.user_id, after, limit)
+    return render_template('my_favourites.html', songs=songs, next_cursor=next_cursor)
+
+
+@app.route('/my_favourites/more') # gets the next page of the current users favourites
+@login_required
+def my_favourites_more():
+    after, limit = page_args()
+    songs, next_cursor = user_favourites(current_user.user_id, after, limit)
+    return render_page_fragment('_favourite_rows.html', next_cursor, songs=songs)
+
 
-    ### DEBUGG START ###
-    print(favourites)
+def user_favourites(user_id, after=None, limit=None):
+    # gets one page of a users favourites, oldest first, and the cursor of the next page
+    return keyset_page(FavouriteSong.query.filter_by(user_id=user_id), FavouriteSong.song_id,
+                       after, limit or app.config['PAGE_SIZE'])
 
-    for song in favourites:
-        print(song.song_name)
-        print(song.artist_name)
 
-    ### DEBUG END ###
-    return favourites # returns the users favourites
+def recent_favourite_query(user_id): # the users newest favourite, with the song information stored when it was added
+    return FavouriteSong.query.filter_by(user_id=user_id).options(db.joinedload(FavouriteSong.track)) \
+        .order_by(FavouriteSong.song_id.desc())
 
 
 @app.route('/add_review', methods=['GET', 'POST']) # allows a user to add a review to a song
@@ -632,15 +856,15 @@ def add_review():
 
     # gets all relevant information about the song and user
     review = request.form.get('review')
-    song_id = request.form.get('song_id')
+    song_id = request.form.get('song_id', type=int)
     user_id = current_user.user_id
-    username = current_user.username
 
     if review and song_id: # checks if the review is provided and a song id is provided
         # adds new review to the review database connected to the song and user
-        new_review = SongReviews(review=review, reviewsong_id=song_id, user_id=user_id, username=username)
+        new_review = SongReviews(review=review, reviewsong_id=song_id, user_id=user_id)
         db.session.add(new_review)
         db.session.commit()
+        review_cache.discard(song_id) # the next results page shows it
         flash('Your review has been added')
         return redirect(url_for('search'))
     else: # error handling
@@ -654,8 +878,10 @@ def delete_review(review_id): # gets the review id
 
     # gets the review to delete
     delete = SongReviews.query.get_or_404(review_id)
+    track_id = delete.reviewsong_id
     db.session.delete(delete) # deletes the review
     db.session.commit()
+    review_cache.discard(track_id)
     flash('Review has been deleted')
     return redirect(url_for('search'))
 
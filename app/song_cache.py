@@ -0,0 +1,163 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def clean_name(value): # trims, collapses whitespace and ignores case
+    return ' '.join((value or '').split()).casefold()
+
+
+def normalize_key(song_name, artist_name): # builds one cache key for every spelling of the same search
+    return clean_name(artist_name) + '\x1f' + clean_name(song_name)
+
+
+class SongCache: # two tier cache for song lookups, in process LRU in front of a shared sqlite file
+
+    def __init__(self, path, max_entries=1024, ttl=86400, negative_ttl=600, stale_ttl=604800, executor=None, app=None):
+        self.path = path
+        self.executor = executor # runs background refreshes
+        self.app = app # refreshes run in its app context, since fetching can read and write the database
+        self.max_entries = max_entries
+        self.ttl = ttl # how long a found song is fresh
+        self.negative_ttl = negative_ttl # how long a "not found" result is fresh
+        self.stale_ttl = stale_ttl # how long past freshness an entry can still be served while it refreshes
+
+        self.memory = OrderedDict() # key -> (stored_at, track), least recently used first
+        self.lock = threading.Lock()
+        self.refreshing = set() # keys currently being revalidated in the background
+        self.local = threading.local() # one sqlite connection per thread
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'stale_hits': 0, 'negative_hits': 0, 'misses': 0}
+
+    ### SHARED DISK STORE ###
+
+    def connection(self): # opens (once per thread) the on-disk store shared by every worker
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL') # lets workers read while another one writes
+            conn.execute('CREATE TABLE IF NOT EXISTS song_cache ('
+                         'cache_key TEXT PRIMARY KEY, stored_at REAL NOT NULL, track TEXT)')
+            conn.commit()
+            self.local.conn = conn
+        return conn
+
+    def read_disk(self, key):
+        try:
+            row = self.connection().execute(
+                'SELECT stored_at, track FROM song_cache WHERE cache_key = ?', (key,)).fetchone()
+        except sqlite3.Error: # the disk tier is best effort, a broken file just means a miss
+            return None
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]) if row[1] is not None else None
+
+    def write_disk(self, key, entry):
+        stored_at, track = entry
+        try:
+            conn = self.connection()
+            conn.execute('INSERT OR REPLACE INTO song_cache (cache_key, stored_at, track) VALUES (?, ?, ?)',
+                         (key, stored_at, json.dumps(track) if track is not None else None))
+            conn.commit()
+        except sqlite3.Error:
+            pass
+
+    ### IN PROCESS LRU ###
+
+    def read_memory(self, key):
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                self.memory.move_to_end(key) # marks the entry as most recently used
+            return entry
+
+    def write_memory(self, key, entry):
+        with self.lock:
+            self.memory[key] = entry
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.max_entries: # evicts the least recently used entries
+                self.memory.popitem(last=False)
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    ### PUBLIC INTERFACE ###
+
+    def get_or_fetch(self, song_name, artist_name, fetch): # returns the cached song, calling fetch() only on a miss
+        key = normalize_key(song_name, artist_name)
+
+        entry = self.read_memory(key)
+        tier = 'memory_hits'
+        if entry is None:
+            entry = self.read_disk(key)
+            tier = 'disk_hits'
+            if entry is not None:
+                self.write_memory(key, entry) # promotes the disk entry so the next lookup stays in process
+
+        if entry is not None:
+            stored_at, track = entry
+            age = time.time() - stored_at
+            fresh_for = self.ttl if track is not None else self.negative_ttl
+            if age < fresh_for:
+                self.count(tier if track is not None else 'negative_hits')
+                return track
+            if age < fresh_for + self.stale_ttl: # serves the stale copy and refreshes it in the background
+                self.count('stale_hits')
+                self.revalidate(key, fetch)
+                return track
+
+        self.count('misses')
+        track = fetch()
+        self.store(key, track)
+        return track
+
+    def peek(self, song_name, artist_name): # returns whatever is cached for a search, however old, without fetching
+        key = normalize_key(song_name, artist_name)
+        entry = self.read_memory(key) or self.read_disk(key)
+        return entry[1] if entry is not None else None
+
+    def store(self, key, track): # saves a result (None meaning "not found") in both tiers
+        entry = (time.time(), track)
+        self.write_memory(key, entry)
+        self.write_disk(key, entry)
+
+    def revalidate(self, key, fetch): # refreshes a stale entry off the request thread, once per key
+        with self.lock:
+            if key in self.refreshing:
+                return
+            self.refreshing.add(key)
+
+        def refresh():
+            try:
+                with self.app.app_context():
+                    self.store(key, fetch())
+            except Exception: # keeps serving the stale copy if the upstream is down
+                self.app.logger.exception('song cache refresh failed')
+            finally:
+                with self.lock:
+                    self.refreshing.discard(key)
+
+        self.executor.submit(refresh)
+
+    def invalidate(self, song_name, artist_name): # forgets a search in both tiers
+        key = normalize_key(song_name, artist_name)
+        with self.lock:
+            self.memory.pop(key, None)
+        try:
+            conn = self.connection()
+            conn.execute('DELETE FROM song_cache WHERE cache_key = ?', (key,))
+            conn.commit()
+        except sqlite3.Error:
+            pass
+
+    def stats(self): # returns a snapshot of the hit and miss counters
+        with self.lock:
+            stats = dict(self.counters)
+            stats['memory_entries'] = len(self.memory)
+        return stats
@@ -0,0 +1,65 @@
+import datetime
+from app import db
+from app import event_versions, upserts
+from app.models import VotedSongs, VoteTally
+
+
+def count_vote(event_id, track_id, song_name, artist_name, votes=1): # adds votes to a songs tally in the current transaction
+    now = datetime.datetime.utcnow()
+    # one statement, so two first votes for a song at once can't both try to add its tally
+    tally = upserts.insert(VoteTally).values(event_id=event_id, track_id=track_id, song_name=song_name,
+                                              artist_name=artist_name, votes=votes, last_voted_at=now)
+    db.session.execute(tally.on_conflict_do_update(
+        index_elements=['event_id', 'track_id'],
+        set_={'votes': VoteTally.votes + tally.excluded.votes, 'last_voted_at': tally.excluded.last_voted_at}))
+
+
+def clear_event(event_id): # removes every tally for an event, used when the event is torn down
+    return VoteTally.query.filter_by(event_id=event_id).delete(synchronize_session=False)
+
+
+def counted_votes(event_id=None): # recounts the tallies from the raw votes
+    query = db.session.query(VotedSongs.event_id, VotedSongs.track_id, db.func.count(VotedSongs.vote_id)) \
+        .filter(VotedSongs.event_id.isnot(None)) \
+        .group_by(VotedSongs.event_id, VotedSongs.track_id)
+    if event_id is not None:
+        query = query.filter(VotedSongs.event_id == event_id)
+    return {(event, track): votes for event, track, votes in query}
+
+
+def stored_votes(event_id=None): # reads the tallies as they are stored
+    query = db.session.query(VoteTally.event_id, VoteTally.track_id, VoteTally.votes)
+    if event_id is not None:
+        query = query.filter(VoteTally.event_id == event_id)
+    return {(event, track): votes for event, track, votes in query}
+
+
+def find_drift(event_id=None): # returns (event_id, track_id, stored, counted) for every tally that is wrong
+    counted = counted_votes(event_id)
+    stored = stored_votes(event_id)
+    drift = []
+    for key in sorted(set(counted) | set(stored), key=lambda k: (k[0], k[1] or 0)):
+        if counted.get(key, 0) != stored.get(key, 0):
+            drift.append((key[0], key[1], stored.get(key, 0), counted.get(key, 0)))
+    return drift
+
+
+def rebuild(event_id=None): # recomputes the tallies from the raw votes in one transaction
+    stale = VoteTally.query
+    votes = db.session.query(VotedSongs.event_id, VotedSongs.track_id,
+                             db.func.min(VotedSongs.song_name), db.func.min(VotedSongs.artist_name),
+                             db.func.count(VotedSongs.vote_id), db.func.current_timestamp()) \
+        .filter(VotedSongs.event_id.isnot(None)) \
+        .group_by(VotedSongs.event_id, VotedSongs.track_id)
+    if event_id is not None:
+        stale = stale.filter(VoteTally.event_id == event_id)
+        votes = votes.filter(VotedSongs.event_id == event_id)
+
+    stale.delete(synchronize_session=False)
+    db.session.execute(db.insert(VoteTally).from_select(
+        ['event_id', 'track_id', 'song_name', 'artist_name', 'votes', 'last_voted_at'], votes))
+    if event_id is not None: # the leaderboards may have changed
+        event_versions.bump(event_id)
+    else:
+        event_versions.bump_all()
+    db.session.commit()
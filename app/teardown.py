@@ -0,0 +1,40 @@
+from app import db, broadcaster
+from app import tallies
+from app import event_versions
+from app.archive import archive_event
+from app.membership import forget_membership
+from app.votebuffer import vote_buffer
+from app.models import User, Events, EventUsers, VotedSongs
+
+
+def teardown_event(event_id, delete=False, archive=False): # ends an event with a few set based statements and one commit
+    # ends whatever the caller has read, so ending the event is the first statement and takes the write lock straight
+    # away, buffered votes check the event is still active in the statement that inserts them, so a batch either
+    # commits first and is archived and removed below, or waits for this commit and is skipped
+    db.session.commit()
+    Events.query.filter_by(event_id=event_id).update({Events.active_status: False}, synchronize_session=False)
+
+    if archive: # keeps the members and votes in the archive tables before they are removed
+        archive_event(event_id)
+
+    members = db.select(EventUsers.user_id).where(EventUsers.event_id == event_id)
+
+    # takes every member out of the event, removes the memberships and the votes
+    User.query.filter(User.user_id.in_(members)) \
+        .update({User.in_event: False, User.current_event_id: None, User.event_role: None,
+                 User.version: User.version + 1}, synchronize_session=False)
+    removed_users = EventUsers.query.filter_by(event_id=event_id).delete(synchronize_session=False)
+    removed_votes = VotedSongs.query.filter_by(event_id=event_id).delete(synchronize_session=False)
+    tallies.clear_event(event_id)
+
+    if delete: # removes the event itself
+        Events.query.filter_by(event_id=event_id).delete(synchronize_session=False)
+    else: # keeps the event, already marked inactive above
+        event_versions.bump(event_id) # polling screens see it has ended
+
+    db.session.commit()
+    db.session.expire_all() # objects already loaded this request (like the current user) are now out of date
+    forget_membership()
+    vote_buffer.forget_event(event_id)
+    broadcaster.publish(event_id, 'ended', {}) # tells everyone still on the event page it has ended
+    return removed_users, removed_votes
@@ -0,0 +1,89 @@
+import datetime
+import threading
+from app import app, db, song_cache, audiodb, background, upserts
+from app.audiodb import AudioDBError
+from app.models import Track
+
+
+refreshing = set() # track ids with a background refresh already queued
+refreshing_lock = threading.Lock()
+
+
+def apply_payload(track, payload): # copies the fields the templates use from a TheAudioDB track
+    track.song_name = payload.get('strTrack') or track.song_name
+    track.artist_name = payload.get('strArtist') or track.artist_name
+    track.album = payload.get('strAlbum')
+    track.genre = payload.get('strGenre')
+    track.thumb_url = payload.get('strTrackThumb')
+    track.music_video = payload.get('strMusicVid')
+    track.refreshed_at = datetime.datetime.utcnow()
+
+
+def remember(track_id, song_name, artist_name): # stores a songs metadata alongside a new favourite or vote
+    try:
+        track_id = int(track_id)
+    except (TypeError, ValueError):
+        return None
+    track = db.session.get(Track, track_id)
+    if track is None: # the first reference to the song, another request may be storing it at the same time
+        db.session.execute(upserts.insert(Track).values(track_id=track_id, song_name=song_name, artist_name=artist_name)
+                           .on_conflict_do_nothing(index_elements=['track_id']))
+        track = db.session.get(Track, track_id)
+
+    # the song was just shown on the results page, so its payload is still in the song cache
+    payload = song_cache.peek(song_name, artist_name)
+    if payload and str(payload.get('idTrack')) == str(track_id):
+        apply_payload(track, payload)
+    return track
+
+
+def is_stale(track): # checks if a tracks metadata is missing or old enough to refresh
+    if track.refreshed_at is None:
+        return True
+    age = datetime.datetime.utcnow() - track.refreshed_at
+    return age.total_seconds() > app.config['TRACK_REFRESH_AGE']
+
+
+def stale_tracks(limit=None): # the tracks with missing or old metadata, oldest first
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=app.config['TRACK_REFRESH_AGE'])
+    query = Track.query.filter(db.or_(Track.refreshed_at.is_(None), Track.refreshed_at < cutoff)) \
+        .order_by(Track.refreshed_at.nullsfirst(), Track.track_id)
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+
+def refresh(tracks): # fetches new metadata for some tracks, returns how many were updated
+    updated = 0
+    for track in tracks:
+        try:
+            payload = song_cache.get_or_fetch(track.song_name, track.artist_name,
+                                              lambda: audiodb.search_track(track.song_name, track.artist_name))
+        except AudioDBError as error: # tries again on the next refresh
+            app.logger.warning(error)
+            continue
+        if payload and str(payload.get('idTrack')) == str(track.track_id):
+            apply_payload(track, payload)
+            updated += 1
+    db.session.commit()
+    return updated
+
+
+def refresh_later(track_ids): # refreshes tracks on the background executor, keeping the api off the request path
+    with refreshing_lock:
+        track_ids = [track_id for track_id in track_ids if track_id not in refreshing]
+        refreshing.update(track_ids)
+    if not track_ids:
+        return
+
+    def run():
+        try:
+            with app.app_context():
+                refresh(Track.query.filter(Track.track_id.in_(track_ids)).all())
+        except Exception: # the page keeps showing the old metadata
+            app.logger.exception('track refresh failed')
+        finally:
+            with refreshing_lock:
+                refreshing.difference_update(track_ids)
+
+    background.submit(run)
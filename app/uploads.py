@@ -0,0 +1,95 @@
+import hashlib
+import os
+import tempfile
+from PIL import Image, ImageOps
+
+
+THUMBNAIL_SIZES = (64, 256) # square thumbnail sizes in pixels, small for lists and large for profiles
+ALLOWED_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+CHUNK_SIZE = 64 * 1024
+Image.MAX_IMAGE_PIXELS = 40_000_000 # refuses decompression bombs before they are decoded
+
+
+class UploadError(Exception): # raised when an uploaded file is too big or not an image
+    pass
+
+
+def save_pfp(storage, folder, max_bytes): # streams an uploaded picture to disk under its content hash name
+    os.makedirs(folder, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+
+    handle, temp_path = tempfile.mkstemp(dir=folder, suffix='.part')
+    try:
+        # copies the upload in chunks so a big file is never held in memory, stopping at the size cap
+        with os.fdopen(handle, 'wb') as out:
+            while True:
+                chunk = storage.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadError(f'Profile pictures must be smaller than {max_bytes // (1024 * 1024)} MB.')
+                digest.update(chunk)
+                out.write(chunk)
+
+        # checks the file really is an image in a format browsers can show
+        try:
+            with Image.open(temp_path) as image:
+                image_format = image.format
+                image.verify()
+        except Exception:
+            raise UploadError('That file is not an image.')
+        if image_format not in ALLOWED_FORMATS:
+            raise UploadError('Profile pictures must be JPEG, PNG, GIF or WebP images.')
+
+        # two users uploading the same picture share one file
+        file_name = digest.hexdigest()[:32] + '.' + ALLOWED_FORMATS[image_format]
+        path = os.path.join(folder, file_name)
+        if os.path.exists(path):
+            os.remove(temp_path)
+        else:
+            os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return file_name
+
+
+def thumbnail_name(file_name, size, extension): # the name of one thumbnail of a picture
+    return f'{os.path.splitext(file_name)[0]}-{size}.{extension}'
+
+
+def make_thumbnails(file_name, folder): # writes the WebP and JPEG thumbnails of a picture, run off the request thread
+    with Image.open(os.path.join(folder, file_name)) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB') # applies the camera rotation and drops transparency
+        for size in THUMBNAIL_SIZES:
+            thumbnail = ImageOps.fit(image, (size, size), Image.LANCZOS)
+            for extension, options in (('webp', {'format': 'WEBP', 'quality': 80, 'method': 4}),
+                                       ('jpg', {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True})):
+                path = os.path.join(folder, thumbnail_name(file_name, size, extension))
+                if os.path.exists(path):
+                    continue
+                temp_path = path + '.part'
+                thumbnail.save(temp_path, **options)
+                os.replace(temp_path, path) # readers never see a half written thumbnail
+
+
+def remove_pfp(file_name, folder): # deletes a picture and its thumbnails
+    names = [file_name] + [thumbnail_name(file_name, size, extension)
+                           for size in THUMBNAIL_SIZES for extension in ('webp', 'jpg')]
+    for name in names:
+        path = os.path.join(folder, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def find_thumbnail(file_name, folder, size, accepts_webp): # the best thumbnail that exists yet, or None
+    extensions = ('webp', 'jpg') if accepts_webp else ('jpg',)
+    for extension in extensions:
+        name = thumbnail_name(file_name, size, extension)
+        if os.path.exists(os.path.join(folder, name)):
+            return name
+    return None
@@ -0,0 +1,8 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+
+
+def insert(model): # an insert with on_conflict_do_nothing and on_conflict_do_update, which both supported databases have
+    if db.engine.dialect.name == 'postgresql':
+        return postgresql.insert(model)
+    return sqlite.insert(model)
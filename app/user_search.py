@@ -0,0 +1,44 @@
+from app import db
+from app.models import User, normalize_username
+
+
+LAST = '\U0010ffff' # sorts after every character, so prefix + LAST ends the prefix's range
+MAX_ID = 2 ** 31 - 1 # the largest user id an integer column holds on every database
+
+
+def search_key(): # the normalized username in byte order, the order its index is in on every database
+    if db.engine.dialect.name == 'postgresql':
+        return User.username_normalized.collate('C')
+    return User.username_normalized
+
+
+def parse_cursor(cursor): # "user_id:normalized name" of the last user on the previous page, or None
+    user_id, _, name = (cursor or '').partition(':')
+    if not user_id.isdecimal() or len(user_id) > len(str(MAX_ID)) or int(user_id) > MAX_ID:
+        return None # a made up cursor starts from the first page rather than failing the query
+    return name, int(user_id)
+
+
+def search_query(prefix, cursor=None, limit=10): # the page query for a normalized prefix
+    key = search_key()
+    # a range of the (normalized name, user id) index rather than a LIKE, so it reads no more rows than it returns,
+    # later pages start the range just after the last user of the one before
+    query = db.select(User.user_id, User.username, User.pfp, User.username_normalized).where(key < prefix + LAST)
+    after = parse_cursor(cursor)
+    if after is not None and after[0] >= prefix:
+        query = query.where(db.tuple_(key, User.user_id) > db.tuple_(*after))
+    else:
+        query = query.where(key >= prefix)
+    return query.order_by(key, User.user_id).limit(limit + 1)
+
+
+def find_users(prefix, cursor=None, limit=10): # one page of users whose name starts with prefix, in name order
+    prefix = normalize_username(prefix)
+    if not prefix:
+        return [], None
+    rows = db.session.execute(search_query(prefix, cursor, limit)).all()
+
+    # one extra row is read to find out if there is another page
+    users = rows[:limit]
+    next_cursor = f'{users[-1].user_id}:{users[-1].username_normalized}' if len(rows) > limit else None
+    return users, next_cursor
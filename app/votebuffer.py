@@ -0,0 +1,224 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import uuid
+from collections import Counter
+from app import app, db
+from app import tallies, tracks, event_versions, upserts
+from app.models import Events, EventUsers, VotedSongs
+
+
+def voted_query(event_id, user_id): # the songs a guest already has votes for in an event
+    return db.select(VotedSongs.track_id).where(VotedSongs.event_id == event_id, VotedSongs.user_id == user_id)
+
+
+def lock_file(file): # an exclusive lock held until the file is closed, raises OSError if another process holds it
+    try:
+        import fcntl
+    except ImportError: # windows
+        import msvcrt
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1) # the first byte stands for the whole file
+    else:
+        fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def insert_votes_query(rows): # inserts the votes of guests still in an active event, returning the ones stored
+    incoming = db.values(db.column('event_id', db.Integer), db.column('user_id', db.Integer),
+                         db.column('track_id', db.Integer), db.column('song_name', db.String),
+                         db.column('artist_name', db.String), name='incoming') \
+        .data([(row['event_id'], row['user_id'], row['track_id'], row['song_name'], row['artist_name'])
+               for row in rows]).cte('incoming')
+    # drivers that send parameters untyped leave the values text, so the ids are cast before they are compared
+    event_id, user_id, track_id = (db.cast(column, db.Integer)
+                                   for column in (incoming.c.event_id, incoming.c.user_id, incoming.c.track_id))
+    # checked in the same statement as the insert, a teardown committing between a separate check and the insert
+    # would leave votes behind for an event that has ended, on postgresql the share lock makes a teardown that has
+    # not committed yet wait for this batch, or this batch wait for it
+    member = db.select(EventUsers.event_user_id) \
+        .join(Events, Events.event_id == EventUsers.event_id) \
+        .where(EventUsers.event_id == event_id, EventUsers.user_id == user_id,
+               Events.active_status.is_(True)) \
+        .with_for_update(read=True)
+    votes = db.select(event_id, user_id, track_id, incoming.c.song_name, incoming.c.artist_name) \
+        .where(member.exists())
+    # another worker may have stored the same vote, even while this batch is being written, the unique index skips it
+    return upserts.insert(VotedSongs) \
+        .from_select(['event_id', 'user_id', 'track_id', 'song_name', 'artist_name'], votes) \
+        .on_conflict_do_nothing() \
+        .returning(VotedSongs.event_id, VotedSongs.track_id, VotedSongs.song_name, VotedSongs.artist_name)
+
+
+class VoteBuffer: # write-behind vote ingestion, accepts votes in memory and inserts them in batches
+
+    def __init__(self, journal_folder, flush_interval=0.02, max_batch=200):
+        self.journal_folder = journal_folder
+        self.flush_interval = flush_interval # seconds a vote can wait before its batch is written
+        self.max_batch = max_batch # votes that trigger a flush straight away
+        self.pending = [] # accepted votes not yet in the database
+        self.voted = {} # event_id -> {user_id: (user version, {track_id})} already voted, loaded once per membership
+        self.lock = threading.Lock()
+        self.wake = threading.Condition(self.lock)
+        self.flush_lock = threading.Lock() # one flush at a time, the timer and shutdown can race
+        self.thread = None
+        self.journal = None
+        self.stopping = False
+
+    ### JOURNAL ###
+
+    # every accepted vote is appended to a journal before it is acknowledged, so a crash loses nothing:
+    # each worker owns one journal (holding a lock on it while alive) and truncates it after each flush,
+    # and a journal nobody holds a lock on was left by a dead worker and is replayed on start
+
+    def open_journal(self):
+        os.makedirs(self.journal_folder, exist_ok=True)
+        path = os.path.join(self.journal_folder, f'votes-{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl')
+        self.journal = open(path, 'a+')
+        lock_file(self.journal)
+
+    def recover(self): # loads the votes from journals left behind by workers that stopped without flushing
+        for path in glob.glob(os.path.join(self.journal_folder, 'votes-*.jsonl')):
+            if path == self.journal.name:
+                continue
+            with open(path) as journal:
+                try:
+                    lock_file(journal)
+                except OSError: # another worker is still running and owns it
+                    continue
+                votes = [tuple(json.loads(line)) for line in journal if line.strip()]
+            with self.lock:
+                for vote in votes:
+                    self.append(vote)
+            os.remove(path)
+
+    def append(self, vote): # with self.lock held
+        self.journal.write(json.dumps(vote) + '\n')
+        self.journal.flush()
+        self.pending.append(vote)
+
+    ### INGESTION ###
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.open_journal()
+            self.thread = threading.Thread(target=self.run, name='vote-buffer', daemon=True)
+            self.thread.start()
+        self.recover()
+        atexit.register(self.stop)
+
+    def load_voted(self, event_id, user_id): # the votes a guest already has in the database for an event
+        return set(db.session.execute(voted_query(event_id, user_id)).scalars())
+
+    def add(self, event_id, user_id, user_version, track_id, song_name, artist_name): # returns False for a duplicate vote
+        self.start()
+        # the user's version goes up on every join and teardown, so votes remembered from an earlier activation of
+        # the event, torn down by another worker, are read again instead of trusted
+        with self.lock:
+            remembered = self.voted.get(event_id, {}).get(user_id)
+        if remembered is None or remembered[0] != user_version:
+            loaded = (user_version, self.load_voted(event_id, user_id))
+            with self.lock:
+                remembered = self.voted.setdefault(event_id, {}).get(user_id)
+                if remembered is None or remembered[0] != user_version:
+                    remembered = self.voted[event_id][user_id] = loaded
+
+        with self.lock:
+            voted = remembered[1]
+            if track_id in voted:
+                return False
+            voted.add(track_id)
+            self.append((event_id, user_id, track_id, song_name, artist_name))
+            if len(self.pending) >= self.max_batch:
+                self.wake.notify()
+        return True
+
+    def forget_event(self, event_id): # drops the votes remembered for an event that has been torn down
+        with self.lock: # any still pending are skipped at flush, the event is no longer active
+            self.voted.pop(event_id, None)
+
+    ### FLUSHING ###
+
+    def run(self):
+        while True:
+            with self.lock:
+                if not self.pending and not self.stopping:
+                    self.wake.wait(self.flush_interval)
+                if self.stopping:
+                    return
+            try:
+                self.flush()
+            except Exception: # keeps the votes pending and tries again on the next tick
+                app.logger.exception('vote buffer flush failed')
+                with self.lock:
+                    self.wake.wait(self.flush_interval)
+
+    def flush(self): # writes the pending votes in one transaction, returns how many were written or skipped
+        with self.flush_lock:
+            with self.lock:
+                batch = self.pending[:self.max_batch * 10]
+            if not batch:
+                return 0
+            with app.app_context():
+                event_ids = self.write(batch)
+
+            # the votes are committed, so they leave the buffer and the journal
+            with self.lock:
+                del self.pending[:len(batch)]
+                self.journal.seek(0)
+                self.journal.truncate()
+                for vote in self.pending:
+                    self.journal.write(json.dumps(vote) + '\n')
+                self.journal.flush()
+
+            from app.routes import publish_event_update
+            with app.app_context():
+                for event_id in event_ids:
+                    publish_event_update(event_id)
+            return len(batch)
+
+    def write(self, batch): # inserts a batch of votes and their tallies, skipping ones that no longer count
+        rows, seen = [], set()
+        for event_id, user_id, track_id, song_name, artist_name in batch:
+            key = (event_id, user_id, track_id)
+            if key not in seen:
+                seen.add(key)
+                rows.append(dict(event_id=event_id, user_id=user_id, track_id=track_id,
+                                 song_name=song_name, artist_name=artist_name))
+
+        # a guest may have left, or the event been torn down, since the vote was accepted, only the votes actually
+        # inserted are counted
+        inserted = db.session.execute(insert_votes_query(rows)).all()
+        if not inserted:
+            db.session.commit()
+            return set()
+        counts = Counter((row.event_id, row.track_id) for row in inserted)
+        names = {(row.event_id, row.track_id): (row.song_name, row.artist_name) for row in inserted}
+        for (event_id, track_id), votes in counts.items():
+            tallies.count_vote(event_id, track_id, *names[(event_id, track_id)], votes=votes)
+        event_ids = {row.event_id for row in inserted}
+        event_versions.bump(event_ids)
+        remembered = [tracks.remember(track_id, song_name, artist_name)
+                      for track_id, (song_name, artist_name) in {key[1]: value for key, value in names.items()}.items()]
+        db.session.commit()
+        tracks.refresh_later([track.track_id for track in remembered if track is not None and tracks.is_stale(track)])
+        return event_ids
+
+    def stop(self): # flushes what is left when the worker shuts down
+        with self.lock:
+            if self.thread is None or self.stopping:
+                return
+            self.stopping = True
+            self.wake.notify()
+        self.thread.join(timeout=5)
+        try:
+            self.flush()
+        except Exception: # the journal still has the votes, the next worker to start replays them
+            app.logger.exception('vote buffer flush on shutdown failed')
+
+
+vote_buffer = VoteBuffer(app.config['VOTE_BUFFER_JOURNAL'], app.config['VOTE_BUFFER_FLUSH_MS'] / 1000,
+                         app.config['VOTE_BUFFER_BATCH'])
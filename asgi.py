@@ -0,0 +1,86 @@
+# async serving mode, run with:
+#
+#     uvicorn asgi:application --workers 4
+#
+# needs uvicorn, asgiref and httpx from requirements.txt. PooledWsgiInstance builds on parts of asgiref's wsgi adapter
+# that are not public api, so asgiref is pinned and checked below, upgrade it only after testing a stream and a
+# search through this server. flask stays a wsgi app, each request runs on a thread pool of
+# ASYNC_THREADS threads, so the database sees at most that many connections per worker process, while song
+# searches go through one httpx client on the server's event loop. a thread waiting on TheAudioDB is cheap,
+# so a slow api no longer ties up the few sync workers everyone else, like the event page, needs.
+# live event streams hold a thread each while they are open, until the keepalive after the guest leaves,
+# so set ASYNC_THREADS above the guests expected on one worker. updates are pushed straight to streams on the
+# worker that made the change, streams on the other workers pick them up from the event version at their next
+# keepalive, every EVENT_STREAM_KEEPALIVE seconds.
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import asgiref
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from app import app, audiodb_async
+
+ASGIREF_VERSION = '3.12.1' # the version PooledWsgiInstance was written against
+if asgiref.__version__ != ASGIREF_VERSION:
+    raise RuntimeError(f'asgi.py needs asgiref {ASGIREF_VERSION}, found {asgiref.__version__}, '
+                       f'install the version pinned in requirements.txt')
+
+app.config['ASYNC_MODE'] = True
+pool = ThreadPoolExecutor(max_workers=app.config['ASYNC_THREADS'], thread_name_prefix='asgi')
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+class PooledWsgiInstance(WsgiToAsgiInstance): # runs each request on the pool instead of asgiref's single thread
+
+    async def __call__(self, scope, receive, send):
+        self.receive = receive
+        self.disconnected = False
+        await super().__call__(scope, receive, send)
+
+    async def run_wsgi_app(self, body):
+        run = WsgiToAsgiInstance.__dict__['run_wsgi_app'].func # the plain function under asgiref's decorator
+        send = self.sync_send
+
+        def sync_send(message): # stops the response once the client is gone, so a closed stream frees its thread
+            if self.disconnected:
+                raise ClientDisconnected()
+            send(message)
+
+        self.sync_send = sync_send
+        watcher = asyncio.ensure_future(self.watch_disconnect())
+        try:
+            await sync_to_async(run, thread_sensitive=False, executor=pool)(self, body)
+        except ClientDisconnected:
+            pass
+        finally:
+            watcher.cancel()
+
+    async def watch_disconnect(self):
+        while (await self.receive())['type'] != 'http.disconnect':
+            pass
+        self.disconnected = True
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await lifespan(receive, send)
+        await PooledWsgiInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+
+async def lifespan(receive, send): # closes the api connections when the server shuts down
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await audiodb_async.aclose()
+            await asyncio.get_running_loop().run_in_executor(None, pool.shutdown)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+application = PooledWsgiToAsgi(app)
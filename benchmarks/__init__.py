@@ -0,0 +1 @@
+# micro benchmarks for single parts of the app, run one with "python -m benchmarks.<name> --help"
@@ -0,0 +1,135 @@
+import argparse
+import shutil
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.common import temp_app, add_database_url, percentile
+from benchmarks.vote_buffer import setup_event
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.async_serving',
+                                     description='Requests per second of searches and event pages, served by a few sync '
+                                                 'workers and by asgi.py, while the song api is slow.')
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds the stub api takes to answer')
+    parser.add_argument('--guests', type=int, default=64, help='guests sending requests at the same time')
+    parser.add_argument('--seconds', type=float, default=10, help='how long each server is loaded')
+    parser.add_argument('--search-share', type=float, default=0.25, help='fraction of requests that are searches')
+    parser.add_argument('--sync-workers', type=int, default=4, help='requests the sync server handles at once')
+    add_database_url(parser)
+    return parser.parse_args()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def serve_sync(app, workers): # a werkzeug server handling a fixed number of requests at once, like sync workers
+    from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+    pool = ThreadPoolExecutor(max_workers=workers)
+
+    class PooledServer(BaseWSGIServer):
+        def process_request(self, request, client_address):
+            pool.submit(self.process_request_thread, request, client_address)
+
+        def process_request_thread(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args): # keeps the report readable
+            pass
+
+    port = free_port()
+    server = PooledServer('127.0.0.1', port, app, handler=QuietHandler)
+    server.request_queue_size = 1024
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{port}', server.shutdown
+
+
+def serve_async(): # asgi.py under uvicorn, in this process so it shares the database and stub api
+    import uvicorn
+    from asgi import application
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(application, host='127.0.0.1', port=port, log_level='warning',
+                                           backlog=1024))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    def stop():
+        server.should_exit = True
+    return f'http://127.0.0.1:{port}', stop
+
+
+def session_cookie(app, user_id): # a signed flask-login session, skipping the login form
+    return app.session_interface.get_signing_serializer(app).dumps({'_user_id': str(user_id), '_fresh': True})
+
+
+def run(app, label, url, guest_ids, args): # every guest loads the event page or searches for a new song, nonstop
+    import requests
+    results, lock = {'search': [], 'page': []}, threading.Lock()
+    errors = [0]
+    deadline = time.perf_counter() + args.seconds
+
+    def guest(n):
+        session = requests.Session()
+        session.cookies.set(app.config['SESSION_COOKIE_NAME'], session_cookie(app, guest_ids[n]))
+        count = 0
+        while time.perf_counter() < deadline:
+            count += 1
+            # every search is for a song nobody looked up yet, so it always goes to the api
+            kind = 'search' if (count * args.search_share) % 1 < args.search_share else 'page'
+            start = time.perf_counter()
+            try:
+                if kind == 'search':
+                    response = session.post(f'{url}/search', data={'song': f'{label} {n} {count}', 'artist': 'Artist'},
+                                            timeout=30)
+                else:
+                    response = session.get(f'{url}/', timeout=30)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            with lock:
+                if ok:
+                    results[kind].append(time.perf_counter() - start)
+                else:
+                    errors[0] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.guests) as pool:
+        list(pool.map(guest, range(args.guests)))
+    elapsed = time.perf_counter() - start
+
+    searches, pages = sorted(results['search']), sorted(results['page'])
+    print(f'{label:<8}{(len(searches) + len(pages)) / elapsed:>8.1f}{len(searches) / elapsed:>10.1f}'
+          f'{len(pages) / elapsed:>9.1f}{errors[0]:>8}{percentile(pages, 0.5) * 1000:>13.1f}'
+          f'{percentile(pages, 0.95) * 1000:>13.1f}{percentile(searches, 0.95) * 1000:>15.1f}')
+
+
+def main():
+    args = parse_args()
+    app, folder = temp_app(api_latency=args.latency, database_url=args.database_url)
+    try:
+        event_id, guest_ids = setup_event(app, 'async_serving', args.guests)
+        print(f'{args.guests} guests, {args.search_share:.0%} searches, song api answering in {args.latency * 1000:.0f} ms, '
+              f'{args.sync_workers} sync workers')
+        print(f"{'server':<8}{'req/s':>8}{'search/s':>10}{'page/s':>9}{'errors':>8}{'page p50 ms':>13}"
+              f"{'page p95 ms':>13}{'search p95 ms':>15}")
+        url, stop = serve_sync(app, args.sync_workers)
+        run(app, 'sync', url, guest_ids, args)
+        stop()
+        url, stop = serve_async() # switches the app into the async mode for the rest of the run
+        run(app, 'async', url, guest_ids, args)
+        stop()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import random
+import shutil
+import time
+from benchmarks.common import temp_app, add_database_url, make_users, logged_in_client, percentile
+
+
+WORDS = ('love', 'night', 'heart', 'fire', 'dance', 'dream', 'light', 'blue', 'summer', 'rain', 'gold', 'wild',
+         'city', 'river', 'star', 'home', 'time', 'road', 'girl', 'moon')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.autocomplete',
+                                     description='Search suggestion latency from the in-memory prefix index.')
+    parser.add_argument('--tracks', type=int, default=50000, help='tracks in the catalog')
+    parser.add_argument('--favourites', type=int, default=20000, help='favourites spread over the tracks')
+    parser.add_argument('--queries', type=int, default=20000, help='prefixes looked up')
+    add_database_url(parser)
+    return parser.parse_args()
+
+
+def fake_name(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).title() + f' {rng.randrange(1000)}'
+
+
+def seed(app, args, rng): # a catalog of made up tracks, some of them favourited
+    import datetime
+    from app import db
+    from app.models import CatalogTrack, FavouriteSong
+    from app.song_cache import clean_name
+    now = datetime.datetime.utcnow()
+    tracks = []
+    for track_id in range(args.tracks):
+        song_name, artist_name = fake_name(rng, 2), fake_name(rng, 1)
+        tracks.append(dict(track_id=track_id, song_name=song_name, artist_name=artist_name, song_key=clean_name(song_name),
+                           artist_key=clean_name(artist_name), payload='{}', seen_at=now))
+    with app.app_context():
+        db.session.execute(db.insert(CatalogTrack), tracks)
+        user_ids = make_users(100, 'autocomplete_')
+        popular = tracks[:args.tracks // 20] # favourites cluster on a few tracks, like real ones do
+        db.session.execute(db.insert(FavouriteSong), [
+            dict(user_id=rng.choice(user_ids), track_id=track['track_id'], song_name=track['song_name'],
+                 artist_name=track['artist_name'])
+            for track in (rng.choice(popular) for _ in range(args.favourites))])
+        db.session.commit()
+    return tracks, user_ids
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(7)
+    app, folder = temp_app(database_url=args.database_url)
+    try:
+        tracks, user_ids = seed(app, args, rng)
+        from app.autocomplete import song_index
+
+        with app.app_context():
+            start = time.perf_counter()
+            song_index.rebuild()
+            print(f'built from {len(song_index.songs)} songs, {len(song_index.terms)} terms, '
+                  f'in {(time.perf_counter() - start) * 1000:.0f} ms')
+
+        queries = []
+        for _ in range(args.queries):
+            track = rng.choice(tracks)
+            song_name, artist_name = track['song_name'], track['artist_name']
+            if rng.random() < 0.7:
+                queries.append((song_name[:rng.randint(2, len(song_name))], ''))
+            else:
+                queries.append((song_name[:rng.randint(2, 6)], artist_name[:rng.randint(2, 4)]))
+
+        timings = []
+        for song_name, artist_name in queries:
+            start = time.perf_counter()
+            song_index.suggest(song_name, artist_name)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        print(f'suggest()    p50 {percentile(timings, 0.5) * 1e6:7.1f} us   p99 {percentile(timings, 0.99) * 1e6:7.1f} us'
+              f'   max {timings[-1] * 1e6:7.1f} us')
+
+        client = logged_in_client(app, user_ids[0])
+        timings = []
+        for song_name, artist_name in queries[:args.queries // 10]:
+            start = time.perf_counter()
+            client.get('/autocomplete', query_string={'song': song_name, 'artist': artist_name})
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        print(f'/autocomplete p50 {percentile(timings, 0.5) * 1e6:7.1f} us   p99 {percentile(timings, 0.99) * 1e6:7.1f} us'
+              f'   (whole request, test client)')
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
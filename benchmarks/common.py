@@ -0,0 +1,51 @@
+import math
+import os
+import tempfile
+from loadtest.stub_api import StubAPI
+
+
+def add_database_url(parser): # lets a run target another database on purpose
+    parser.add_argument('--database-url', help='migrate and fill this database instead of a temporary sqlite one, '
+                                               'it is left with the test rows')
+
+
+def temp_app(api_latency=0, database_url=None, **environ): # imports the app against a throwaway database and a stub api
+    stub = StubAPI(latency=api_latency).start()
+    folder = tempfile.mkdtemp(prefix='benchmark-')
+    # never an exported DATABASE_URL, which is usually the real database
+    os.environ['DATABASE_URL'] = database_url or 'sqlite:///' + os.path.join(folder, 'app.db')
+    os.environ['SONG_CACHE_PATH'] = os.path.join(folder, 'song_cache.db')
+    os.environ['UPLOAD_FOLDER'] = os.path.join(folder, 'uploads')
+    os.environ['VOTE_BUFFER_JOURNAL'] = os.path.join(folder, 'vote_journal')
+    os.environ['AUDIODB_URL'] = stub.url
+    os.environ.update(environ)
+
+    import flask_migrate
+    from app import app
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        flask_migrate.upgrade(directory=os.path.join(os.path.dirname(app.root_path), 'migrations'))
+    return app, folder # the stub runs on a daemon thread until the benchmark exits
+
+
+def make_users(count, prefix): # adds users straight to the database, without hashing a password for each
+    from app import db
+    from app.models import User
+    users = [User(username=f'{prefix}{n}', email=f'{prefix}{n}@example.com', password_hash='-') for n in range(count)]
+    db.session.add_all(users)
+    db.session.commit()
+    return [user.user_id for user in users]
+
+
+def logged_in_client(app, user_id): # a test client with a flask-login session, skipping the login form
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+def percentile(values, fraction): # nearest rank percentile of sorted values
+    if not values:
+        return 0
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
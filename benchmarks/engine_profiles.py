@@ -0,0 +1,104 @@
+import argparse
+import os
+import shutil
+import threading
+import time
+from benchmarks.common import temp_app, percentile
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.engine_profiles',
+                                     description='Write throughput of concurrent vote transactions for each engine profile.')
+    parser.add_argument('--threads', type=int, default=16, help='connections writing at the same time')
+    parser.add_argument('--writes', type=int, default=200, help='transactions per thread')
+    parser.add_argument('--readers', type=int, default=4, help='threads reading the leaderboard meanwhile')
+    parser.add_argument('--postgres-url', default=os.environ.get('BENCHMARK_POSTGRES_URL'),
+                        help='an empty postgresql database to include, its tables are created and dropped')
+    return parser.parse_args()
+
+
+def profile_config(app, profile):
+    config = dict(app.config)
+    config['DATABASE_PROFILE'] = profile
+    return config
+
+
+def run(app, label, url, profile, args): # threads each insert a vote and bump its tally, one transaction per vote
+    import sqlalchemy as sa
+    from app import db
+    from app.engine_profiles import engine_options, configure_engine
+    from app.models import VotedSongs, VoteTally, Events
+
+    config = profile_config(app, profile)
+    engine = sa.create_engine(url, **engine_options(config))
+    configure_engine(engine, config)
+    tables = [db.metadata.tables[name] for name in ('user', 'events', 'voted_songs', 'vote_tally')]
+    db.metadata.drop_all(engine, tables=tables)
+    db.metadata.create_all(engine, tables=tables)
+    with engine.begin() as conn:
+        conn.execute(sa.insert(Events).values(event_id=1, event_name='bench', event_code=1, active_status=True))
+
+    latencies, errors, lock = [], [0], threading.Lock()
+    stop_reading = threading.Event()
+
+    def write(thread):
+        for n in range(args.writes):
+            track_id = n % 50
+            start = time.perf_counter()
+            try:
+                with engine.begin() as conn:
+                    conn.execute(sa.insert(VotedSongs).values(event_id=1, user_id=thread, track_id=track_id,
+                                                              song_name='Song', artist_name='Artist'))
+                    updated = conn.execute(sa.update(VoteTally).where(VoteTally.event_id == 1,
+                                                                      VoteTally.track_id == track_id)
+                                           .values(votes=VoteTally.votes + 1)).rowcount
+                    if not updated:
+                        conn.execute(sa.insert(VoteTally).values(event_id=1, track_id=track_id, votes=1))
+            except sa.exc.DBAPIError: # "database is locked", a lock timeout or a racing first vote
+                with lock:
+                    errors[0] += 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    def read():
+        while not stop_reading.is_set():
+            with engine.connect() as conn:
+                conn.execute(sa.select(VoteTally).where(VoteTally.event_id == 1)
+                             .order_by(VoteTally.votes.desc()).limit(20)).all()
+
+    readers = [threading.Thread(target=read) for _ in range(args.readers)]
+    writers = [threading.Thread(target=write, args=(n,)) for n in range(args.threads)]
+    start = time.perf_counter()
+    for thread in readers + writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stop_reading.set()
+    for thread in readers:
+        thread.join()
+    db.metadata.drop_all(engine, tables=tables)
+    engine.dispose()
+
+    latencies.sort()
+    print(f'{label:<22}{len(latencies) / elapsed:>10.1f}{errors[0]:>8}'
+          f'{percentile(latencies, 0.5) * 1000:>9.1f}{percentile(latencies, 0.99) * 1000:>9.1f}')
+
+
+def main():
+    args = parse_args()
+    app, folder = temp_app()
+    try:
+        print(f'{args.threads} writers x {args.writes} transactions, {args.readers} readers')
+        print(f"{'profile':<22}{'writes/s':>10}{'errors':>8}{'p50 ms':>9}{'p99 ms':>9}")
+        run(app, 'sqlite, default', 'sqlite:///' + os.path.join(folder, 'default.db'), 'default', args)
+        run(app, 'sqlite, sqlite profile', 'sqlite:///' + os.path.join(folder, 'tuned.db'), 'sqlite', args)
+        if args.postgres_url:
+            run(app, 'postgresql profile', args.postgres_url, 'postgresql', args)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import shutil
+import time
+from benchmarks.common import temp_app, add_database_url, logged_in_client, percentile
+from benchmarks.vote_buffer import setup_event
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.event_api',
+                                     description='Cost of polling the event json api, with and without If-None-Match.')
+    parser.add_argument('--guests', type=int, default=200, help='guests in the event')
+    parser.add_argument('--songs', type=int, default=500, help='songs on the leaderboard')
+    parser.add_argument('--polls', type=int, default=2000, help='requests sent for each way of polling')
+    add_database_url(parser)
+    return parser.parse_args()
+
+
+def seed_votes(app, event_id, guest_ids, songs): # one vote for each song, spread over the guests
+    from app import db, tallies
+    from app.models import VotedSongs
+    with app.app_context():
+        db.session.execute(db.insert(VotedSongs), [
+            dict(song_name=f'Song {n}', artist_name='Artist', track_id=10000 + n, event_id=event_id,
+                 user_id=guest_ids[n % len(guest_ids)]) for n in range(songs)])
+        db.session.commit()
+        tallies.rebuild(event_id)
+
+
+def poll(client, url, polls, etag=None): # the latency of each request and the queries they ran
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    queries = [0]
+
+    def count(*args):
+        queries[0] += 1
+
+    event.listen(Engine, 'before_cursor_execute', count)
+    timings = []
+    try:
+        for _ in range(polls):
+            start = time.perf_counter()
+            response = client.get(url, headers={'If-None-Match': etag} if etag else {})
+            timings.append(time.perf_counter() - start)
+    finally:
+        event.remove(Engine, 'before_cursor_execute', count)
+    return sorted(timings), queries[0] / polls, response
+
+
+def main():
+    args = parse_args()
+    app, folder = temp_app(database_url=args.database_url)
+    try:
+        event_id, guest_ids = setup_event(app, 'event_api', args.guests)
+        seed_votes(app, event_id, guest_ids, args.songs)
+        client = logged_in_client(app, guest_ids[0])
+
+        print(f'{args.guests} guests, {args.songs} songs, {args.polls} polls each')
+        print(f"{'request':<24}{'status':>7}{'queries':>9}{'bytes':>8}{'p50 us':>9}{'p99 us':>9}")
+        for kind in ('leaderboard', 'members'):
+            url = f'/api/events/{event_id}/{kind}'
+            for label, etag in (('full', None), ('If-None-Match', client.get(url).headers['ETag'])):
+                timings, queries, response = poll(client, url, args.polls, etag)
+                print(f'{kind + " " + label:<24}{response.status_code:>7}{queries:>9.1f}{len(response.data):>8}'
+                      f'{percentile(timings, 0.5) * 1e6:>9.0f}{percentile(timings, 0.99) * 1e6:>9.0f}')
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import argparse
+import random
+import shutil
+import string
+import time
+from benchmarks.common import temp_app, add_database_url, logged_in_client, percentile
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.user_search',
+                                     description='Prefix user search on a large user table, showing it reads the index.')
+    parser.add_argument('--users', type=int, default=100000, help='users in the table')
+    parser.add_argument('--queries', type=int, default=2000, help='prefixes looked up')
+    parser.add_argument('--pages', type=int, default=20, help='pages followed for the deep paging test')
+    add_database_url(parser)
+    return parser.parse_args()
+
+
+def seed(app, count, rng): # adds users straight to the table, a mix of cases like real sign ups
+    from app import db
+    from app.models import User, normalize_username
+    rows = []
+    for n in range(count):
+        name = ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 8))) + str(n)
+        if rng.random() < 0.3:
+            name = name.capitalize()
+        rows.append(dict(username=name, username_normalized=normalize_username(name), email=f'{name}@example.com',
+                         password_hash='-', version=0))
+    with app.app_context():
+        db.session.execute(db.insert(User), rows)
+        db.session.commit()
+        return db.session.execute(db.select(User.user_id).limit(1)).scalar(), [row['username'] for row in rows]
+
+
+def timed(call, repeat):
+    timings = []
+    for args in repeat:
+        start = time.perf_counter()
+        call(*args)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return f'p50 {percentile(timings, 0.5) * 1000:7.3f} ms   p99 {percentile(timings, 0.99) * 1000:7.3f} ms'
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(3)
+    app, folder = temp_app(database_url=args.database_url)
+    try:
+        user_id, names = seed(app, args.users, rng)
+        from app import db, user_search
+        from app.models import User
+        prefixes = [name[:rng.randint(1, 4)] for name in rng.sample(names, args.queries)]
+
+        with app.app_context():
+            if db.engine.dialect.name == 'sqlite':
+                query = user_search.search_query('ab', '500:abc', 10).compile(db.engine,
+                                                                               compile_kwargs={'literal_binds': True})
+                plan = db.session.execute(db.text('EXPLAIN QUERY PLAN ' + str(query))).all()
+                print('plan:', '; '.join(row[-1] for row in plan))
+
+            print(f'{args.users} users, {args.queries} prefixes of 1 to 4 letters, 10 per page')
+            print(f"{'find_users, first page':<32}{timed(lambda prefix: user_search.find_users(prefix), [(p,) for p in prefixes])}")
+
+            def deep(prefix): # follows the cursor page after page, each page should cost the same
+                cursor = None
+                for _ in range(args.pages):
+                    _, cursor = user_search.find_users(prefix, cursor)
+                    if cursor is None:
+                        break
+            print(f"{f'find_users, {args.pages} pages deep':<32}"
+                  f"{timed(deep, [(p[:1],) for p in prefixes[:args.queries // 10]])}")
+
+            def scan(prefix): # the query this replaced would need a LIKE on lower(username), which reads every row
+                db.session.execute(db.select(User.user_id, User.username).where(
+                    db.func.lower(User.username).like(prefix.lower() + '%')).order_by(User.username).limit(11)).all()
+            print(f"{'lower(username) LIKE, for scale':<32}{timed(scan, [(p,) for p in prefixes[:args.queries // 10]])}")
+
+        client = logged_in_client(app, user_id)
+        print(f"{'/users/search, whole request':<32}"
+              f"{timed(lambda prefix: client.get('/users/search', query_string={'q': prefix, 'limit': 10}), [(p,) for p in prefixes[:args.queries // 4]])}")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
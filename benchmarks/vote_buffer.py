@@ -0,0 +1,79 @@
+import argparse
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.common import temp_app, add_database_url, make_users, logged_in_client, percentile
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.vote_buffer',
+                                     description='Votes per second with direct writes and with the write-behind buffer.')
+    parser.add_argument('--guests', type=int, default=200, help='guests voting in the event')
+    parser.add_argument('--votes', type=int, default=5, help='votes cast by each guest')
+    parser.add_argument('--concurrency', type=int, default=32, help='votes in flight at the same time')
+    add_database_url(parser)
+    return parser.parse_args()
+
+
+def setup_event(app, name, guests): # an active event with every guest already in it
+    from app import db
+    from app.models import Events, EventUsers, User
+    from app import membership
+    with app.test_request_context():
+        admin_id, *guest_ids = make_users(guests + 1, f'{name}_')
+        event = Events(event_name=name, event_code=abs(hash(name)) % 100000, user_id=admin_id, active_status=True)
+        db.session.add(event)
+        db.session.flush()
+        db.session.add(EventUsers(event_id=event.event_id, user_id=admin_id, is_admin=True))
+        for user in User.query.filter(User.user_id.in_(guest_ids)):
+            db.session.add(EventUsers(event_id=event.event_id, user_id=user.user_id))
+            membership.join_event(user, event.event_id, 'guest')
+        db.session.commit()
+        return event.event_id, guest_ids
+
+
+def run(app, name, buffered, args): # every guest votes for args.votes different songs, all at once
+    from app.models import VotedSongs
+    from app.votebuffer import vote_buffer
+    app.config['VOTE_BUFFER'] = buffered
+    event_id, guest_ids = setup_event(app, name, args.guests)
+    clients = {user_id: logged_in_client(app, user_id) for user_id in guest_ids}
+    jobs = [(user_id, track) for track in range(args.votes) for user_id in guest_ids]
+
+    def vote(job):
+        user_id, track = job
+        start = time.perf_counter()
+        response = clients[user_id].post('/vote_song', data=dict(
+            song_name=f'Song {track}', artist_name='Artist', track_id=str(1000 + track)))
+        return time.perf_counter() - start, response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(vote, jobs))
+    if buffered: # the votes only count once they are in the database
+        vote_buffer.flush()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        stored = VotedSongs.query.filter_by(event_id=event_id).count()
+    latencies = sorted(seconds for seconds, _ in results)
+    errors = sum(1 for _, status in results if status >= 500)
+    print(f"{'buffered' if buffered else 'direct':<10}{len(jobs) / elapsed:>10.1f}{errors:>8}{stored:>8}"
+          f"{percentile(latencies, 0.5) * 1000:>9.1f}{percentile(latencies, 0.95) * 1000:>9.1f}"
+          f"{percentile(latencies, 0.99) * 1000:>9.1f}")
+
+
+def main():
+    args = parse_args()
+    app, folder = temp_app(database_url=args.database_url)
+    try:
+        print(f'{args.guests} guests x {args.votes} votes, {args.concurrency} in flight')
+        print(f"{'mode':<10}{'votes/s':>10}{'errors':>8}{'stored':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        run(app, 'direct', False, args)
+        run(app, 'buffered', True, args)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,4 +7,85 @@ class Config(object):
 
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
             'sqlite:///' + os.path.join(basedir, 'app.db')
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # named engine tuning: "sqlite", "postgresql", or "default" for sqlalchemy's own settings,
+    # picked from the database url when unset
+    DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE') or SQLALCHEMY_DATABASE_URI.split(':')[0].split('+')[0]
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT') or 5000) # milliseconds
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE') or 256 * 1024 * 1024) # bytes
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE') or -64 * 1024) # KiB when negative
+    DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE') or 10) # postgresql connections kept per worker
+    DATABASE_MAX_OVERFLOW = int(os.environ.get('DATABASE_MAX_OVERFLOW') or 10)
+    DATABASE_POOL_TIMEOUT = int(os.environ.get('DATABASE_POOL_TIMEOUT') or 10) # seconds to wait for a connection
+    DATABASE_POOL_RECYCLE = int(os.environ.get('DATABASE_POOL_RECYCLE') or 30 * 60) # seconds
+    DATABASE_STATEMENT_TIMEOUT = int(os.environ.get('DATABASE_STATEMENT_TIMEOUT') or 5000) # milliseconds
+    DATABASE_LOCK_TIMEOUT = int(os.environ.get('DATABASE_LOCK_TIMEOUT') or 2000) # milliseconds
+
+    # song search cache, the sqlite file is shared by every worker on the host
+    SONG_CACHE_PATH = os.environ.get('SONG_CACHE_PATH') or \
+            os.path.join(basedir, 'song_cache.db')
+    SONG_CACHE_SIZE = int(os.environ.get('SONG_CACHE_SIZE') or 1024) # entries kept in process
+    SONG_CACHE_TTL = int(os.environ.get('SONG_CACHE_TTL') or 24 * 60 * 60) # seconds a found song is fresh
+    SONG_CACHE_NEGATIVE_TTL = int(os.environ.get('SONG_CACHE_NEGATIVE_TTL') or 10 * 60) # seconds "not found" is fresh
+    SONG_CACHE_STALE_TTL = int(os.environ.get('SONG_CACHE_STALE_TTL') or 7 * 24 * 60 * 60) # seconds a stale song is still served
+
+    # TheAudioDB song api client
+    AUDIODB_URL = os.environ.get('AUDIODB_URL') or 'https://theaudiodb.com/api/v1/json'
+    AUDIODB_API_KEY = os.environ.get('AUDIODB_API_KEY') or '523532'
+    AUDIODB_CONNECT_TIMEOUT = float(os.environ.get('AUDIODB_CONNECT_TIMEOUT') or 3.05) # seconds
+    AUDIODB_READ_TIMEOUT = float(os.environ.get('AUDIODB_READ_TIMEOUT') or 5) # seconds
+    AUDIODB_RETRIES = int(os.environ.get('AUDIODB_RETRIES') or 2)
+    AUDIODB_BACKOFF = float(os.environ.get('AUDIODB_BACKOFF') or 0.3) # seconds, doubled on each retry
+    AUDIODB_POOL_SIZE = int(os.environ.get('AUDIODB_POOL_SIZE') or 10) # kept alive connections per worker
+
+    # serving through asgi.py, the app runs on a bounded thread pool and song searches on the server's event loop
+    ASYNC_MODE = False # switched on by asgi.py
+    ASYNC_THREADS = int(os.environ.get('ASYNC_THREADS') or 32) # requests handled at once per worker process
+
+    # fails a request when a view with a query budget goes over it, always on in debug and testing
+    QUERY_BUDGET_CHECKS = os.environ.get('QUERY_BUDGET_CHECKS') == '1'
+
+    # seconds between keepalive comments on the live event page stream, each one first checks the event version so
+    # changes made on other worker processes reach the stream within this long
+    EVENT_STREAM_KEEPALIVE = int(os.environ.get('EVENT_STREAM_KEEPALIVE') or 5)
+
+    # logged in users whose login columns are cached per worker
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE') or 512)
+
+    # rows per page for favourites and reviews, and the most a client can ask for
+    PAGE_SIZE = int(os.environ.get('PAGE_SIZE') or 25)
+    MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE') or 100)
+
+    # songs whose first page of reviews is cached per worker, and seconds before a cached page is read again
+    REVIEW_CACHE_SIZE = int(os.environ.get('REVIEW_CACHE_SIZE') or 1024)
+    REVIEW_CACHE_TTL = int(os.environ.get('REVIEW_CACHE_TTL') or 60)
+
+    # profile pictures, stored under their content hash with generated thumbnails
+    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or os.path.join(basedir, 'app', 'static', 'uploads')
+    MAX_PFP_BYTES = int(os.environ.get('MAX_PFP_BYTES') or 5 * 1024 * 1024)
+    MAX_CONTENT_LENGTH = MAX_PFP_BYTES + 64 * 1024 # rejects bigger requests before they are read
+    PFP_CACHE_SECONDS = 365 * 24 * 60 * 60
+
+    # fingerprinted and precompressed static files written by "flask assets build"
+    ASSET_MANIFEST = os.environ.get('ASSET_MANIFEST') or os.path.join(basedir, 'app', 'static', 'dist', 'manifest.json')
+    ASSET_CACHE_SECONDS = 365 * 24 * 60 * 60
+
+    # seconds before the stored metadata of a favourited or voted song is refreshed in the background
+    TRACK_REFRESH_AGE = int(os.environ.get('TRACK_REFRESH_AGE') or 30 * 24 * 60 * 60)
+
+    # seconds a track in the local catalog answers searches before the api is asked again
+    CATALOG_MAX_AGE = int(os.environ.get('CATALOG_MAX_AGE') or 30 * 24 * 60 * 60)
+
+    # search form suggestions, from an in memory index of the songs people have favourited, voted for or searched
+    AUTOCOMPLETE_LIMIT = int(os.environ.get('AUTOCOMPLETE_LIMIT') or 8) # suggestions returned at most
+    AUTOCOMPLETE_MAX_AGE = int(os.environ.get('AUTOCOMPLETE_MAX_AGE') or 10 * 60) # seconds before it is rebuilt
+
+    # bearer token prometheus must send to read /metrics, open to anyone when unset
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # write-behind voting, votes are accepted in memory and inserted in batches, for busy events
+    VOTE_BUFFER = os.environ.get('VOTE_BUFFER') == '1'
+    VOTE_BUFFER_FLUSH_MS = int(os.environ.get('VOTE_BUFFER_FLUSH_MS') or 20) # longest a vote waits to be written
+    VOTE_BUFFER_BATCH = int(os.environ.get('VOTE_BUFFER_BATCH') or 200) # votes that trigger a flush straight away
+    VOTE_BUFFER_JOURNAL = os.environ.get('VOTE_BUFFER_JOURNAL') or os.path.join(basedir, 'vote_journal')
@@ -0,0 +1 @@
+# simulates a full event night against the real app, run with "python -m loadtest --help"
@@ -0,0 +1,81 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from loadtest.stub_api import StubAPI
+from loadtest.report import Recorder, format_text
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m loadtest',
+                                     description='Simulates an event night against the app and reports per route latency.')
+    parser.add_argument('--guests', type=int, default=500, help='guests that join the event')
+    parser.add_argument('--concurrency', type=int, default=50, help='guests active at the same time')
+    parser.add_argument('--actions', type=int, default=10, help='searches, votes and page loads per guest')
+    parser.add_argument('--think-time', type=float, default=0, help='most seconds a guest waits between actions')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds the stub api takes to answer')
+    parser.add_argument('--seed', type=int, default=1, help='random seed, so runs can be compared')
+    parser.add_argument('--json', dest='json_path', help='also write the report as json to this file')
+    parser.add_argument('--keep', action='store_true', help='keep the temporary database and caches')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    stub = StubAPI(latency=args.latency).start()
+    folder = tempfile.mkdtemp(prefix='loadtest-')
+
+    # points the app at a throwaway database and the stub before it is imported
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(folder, 'app.db')
+    os.environ['SONG_CACHE_PATH'] = os.path.join(folder, 'song_cache.db')
+    os.environ['UPLOAD_FOLDER'] = os.path.join(folder, 'uploads')
+    os.environ['AUDIODB_URL'] = stub.url
+
+    from flask import g
+    import flask_migrate
+    from app import app
+    from loadtest.scenarios import Guest, host_event, end_event
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        flask_migrate.upgrade(directory=os.path.join(os.path.dirname(app.root_path), 'migrations'))
+
+    @app.after_request
+    def report_query_count(response): # lets the harness read how many statements each request ran
+        response.headers['X-Query-Count'] = str(g.get('query_count', 0))
+        return response
+
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    event_code = 4242
+    try:
+        start = time.perf_counter()
+        admin, event_id = host_event(app, recorder, rng, event_code)
+        guests = [Guest(app, recorder, f'guest{n}', random.Random(rng.random())) for n in range(args.guests)]
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for future in [pool.submit(guest.run, event_code, args.actions, args.think_time) for guest in guests]:
+                future.result()
+        end_event(admin, event_id)
+        wall_seconds = time.perf_counter() - start
+    finally:
+        stub.stop()
+        if not args.keep:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    report = recorder.summary(wall_seconds)
+    report['api_calls'] = stub.calls
+    report['settings'] = vars(args)
+    print(format_text(report))
+    if args.json_path:
+        with open(args.json_path, 'w') as out:
+            json.dump(report, out, indent=2)
+    return 1 if report['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+import math
+import threading
+from collections import defaultdict
+
+
+def percentile(values, fraction): # nearest rank percentile of sorted values
+    if not values:
+        return 0
+    index = max(0, math.ceil(fraction * len(values)) - 1)
+    return values[index]
+
+
+class Recorder: # collects one sample per request from every simulated guest
+
+    def __init__(self):
+        self.samples = defaultdict(list) # route -> list of (seconds, status, queries)
+        self.lock = threading.Lock()
+
+    def record(self, route, seconds, status, queries):
+        with self.lock:
+            self.samples[route].append((seconds, status, queries))
+
+    def summary(self, wall_seconds): # per route throughput, latency percentiles and sql statements
+        routes = {}
+        with self.lock:
+            samples = {route: list(values) for route, values in self.samples.items()}
+        for route, values in sorted(samples.items()):
+            latencies = sorted(seconds for seconds, _, _ in values)
+            queries = [count for _, _, count in values if count is not None]
+            routes[route] = {
+                'requests': len(values),
+                'errors': sum(1 for _, status, _ in values if status >= 500),
+                'throughput': round(len(values) / wall_seconds, 2) if wall_seconds else 0,
+                'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+                'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+                'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+                'max_ms': round(latencies[-1] * 1000, 2),
+                'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+            }
+        total = sum(route['requests'] for route in routes.values())
+        return {
+            'wall_seconds': round(wall_seconds, 2),
+            'requests': total,
+            'errors': sum(route['errors'] for route in routes.values()),
+            'throughput': round(total / wall_seconds, 2) if wall_seconds else 0,
+            'routes': routes,
+        }
+
+
+def format_text(report): # a fixed width table of the summary, for comparing runs by eye
+    lines = [f"{report['requests']} requests in {report['wall_seconds']}s, "
+             f"{report['throughput']} req/s, {report['errors']} errors, "
+             f"{report['api_calls']} api calls",
+             '',
+             f"{'route':<28}{'reqs':>7}{'err':>5}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'sql':>7}"]
+    for route, stats in report['routes'].items():
+        queries = '-' if stats['queries_per_request'] is None else f"{stats['queries_per_request']:.1f}"
+        lines.append(f"{route:<28}{stats['requests']:>7}{stats['errors']:>5}{stats['throughput']:>9.1f}"
+                     f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{queries:>7}")
+    lines.append('')
+    lines.append('latencies in ms, sql is statements per request')
+    return '\n'.join(lines)
@@ -0,0 +1,107 @@
+import re
+import time
+
+
+# songs guests search for, a few popular ones are searched far more often than the rest
+SONGS = [(f'Song {n}', f'Artist {n % 40}') for n in range(200)]
+POPULAR = SONGS[:10]
+MISSING = ('nope', 'Nobody') # a search the api has no result for
+
+# what a guest does once they are in the event, and how often relative to each other
+ACTIONS = {
+    'poll': 5, # reloads the event page to see the leaderboard
+    'search': 4,
+    'vote': 3, # searches then votes for the result
+    'home': 1,
+}
+
+TRACK_ID = re.compile(rb'name="track_id" value="(\d+)"')
+
+
+class Guest: # one simulated user with their own cookie jar
+
+    def __init__(self, app, recorder, username, rng):
+        self.client = app.test_client()
+        self.recorder = recorder
+        self.username = username
+        self.rng = rng
+        self.event_id = None
+
+    def request(self, route, method, path, **kwargs): # sends one request and records how it went
+        start = time.perf_counter()
+        response = self.client.open(path, method=method, **kwargs)
+        elapsed = time.perf_counter() - start
+        queries = response.headers.get('X-Query-Count')
+        self.recorder.record(route, elapsed, response.status_code, int(queries) if queries else None)
+        return response
+
+    def register(self):
+        self.request('POST /register', 'POST', '/register', data=dict(
+            username=self.username, email=f'{self.username}@example.com', password='loadtest',
+            password2='loadtest'))
+        self.request('POST /login', 'POST', '/login', data=dict(username=self.username, password='loadtest'))
+
+    def join(self, event_code):
+        response = self.request('POST /join_event', 'POST', '/join_event', data=dict(event_code=str(event_code)))
+        match = re.search(r'/event/(\d+)', response.headers.get('Location', ''))
+        self.event_id = int(match.group(1)) if match else None
+        return self.event_id
+
+    def pick_song(self):
+        roll = self.rng.random()
+        if roll < 0.05:
+            return MISSING
+        if roll < 0.6:
+            return self.rng.choice(POPULAR)
+        return self.rng.choice(SONGS)
+
+    def search(self):
+        song_name, artist_name = self.pick_song()
+        response = self.request('POST /search', 'POST', '/search', data=dict(song=song_name, artist=artist_name))
+        match = TRACK_ID.search(response.data)
+        return (song_name, artist_name, match.group(1).decode()) if match else None
+
+    def vote(self):
+        found = self.search()
+        if found is None:
+            return
+        song_name, artist_name, track_id = found
+        self.request('POST /vote_song', 'POST', '/vote_song', data=dict(
+            song_name=song_name, artist_name=artist_name, track_id=track_id))
+
+    def poll(self):
+        if self.event_id is not None:
+            self.request('GET /event/<id>', 'GET', f'/event/{self.event_id}')
+
+    def home(self):
+        self.request('GET /index', 'GET', '/index')
+
+    def run(self, event_code, actions, think_time): # a whole night for one guest
+        self.register()
+        if self.join(event_code) is None:
+            return
+        names, weights = zip(*ACTIONS.items())
+        for _ in range(actions):
+            getattr(self, self.rng.choices(names, weights)[0])()
+            if think_time:
+                time.sleep(self.rng.uniform(0, think_time))
+
+
+def host_event(app, recorder, rng, event_code): # the admin and dj that every guest joins
+    dj = Guest(app, recorder, 'loadtest_dj', rng)
+    dj.register()
+    admin = Guest(app, recorder, 'loadtest_admin', rng)
+    admin.register()
+    admin.request('POST /create_event', 'POST', '/create_event', data=dict(
+        event_name='Load Test Night', event_code=str(event_code), event_location='Here',
+        event_description='A simulated event', dj=dj.username))
+    from app.models import Events
+    with app.app_context():
+        event_id = Events.query.filter_by(event_code=event_code).first().event_id
+    admin.request('POST /event_status/<id>', 'POST', f'/event_status/{event_id}') # activates the event
+    dj.join(event_code)
+    return admin, event_id
+
+
+def end_event(admin, event_id): # the admin deactivates the event, tearing it down for every guest
+    admin.request('POST /event_status/<id>', 'POST', f'/event_status/{event_id}')
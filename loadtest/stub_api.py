@@ -0,0 +1,58 @@
+import json
+import threading
+import time
+import zlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+
+MISSING_TRACK = 'nope' # searches for this song name get "not found"
+
+
+def fake_track(song_name, artist_name): # a TheAudioDB style track, with an id that is stable across runs
+    track_id = zlib.crc32(f'{artist_name.casefold()}\x1f{song_name.casefold()}'.encode()) % 10_000_000
+    return {'idTrack': str(track_id), 'strTrack': song_name, 'strArtist': artist_name, 'strAlbum': 'Load Test',
+            'strGenre': 'Test', 'strTrackThumb': None, 'strMusicVid': None, 'strDescriptionEN': None}
+
+
+class StubAPI: # a local stand in for TheAudioDB that answers searchtrack.php after a set delay
+
+    def __init__(self, latency=0.05, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.calls = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub.lock:
+                    stub.calls += 1
+                time.sleep(stub.latency)
+                query = parse_qs(urlparse(self.path).query)
+                song_name, artist_name = query.get('t', [''])[0], query.get('s', [''])[0]
+                tracks = None if song_name == MISSING_TRACK else [fake_track(song_name, artist_name)]
+                body = json.dumps({'track': tracks}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args): # keeps the report readable
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f'http://{host}:{port}/api'
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
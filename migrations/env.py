@@ -51,6 +51,14 @@ def get_metadata():
     return target_db.metadata
 
 
+# tables that are created by hand in a migration rather than from the models, so autogenerate
+# shouldn't try to drop them: the catalog full-text index and the shadow tables sqlite keeps for it
+def include_name(name, type_, parent_names):
+    if type_ == 'table':
+        return not name.startswith('catalog_search')
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -65,7 +73,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_name=include_name
     )
 
     with context.begin_transaction():
@@ -97,6 +106,7 @@ def run_migrations_online():
             connection=connection,
             target_metadata=get_metadata(),
             process_revision_directives=process_revision_directives,
+            include_name=include_name,
             **current_app.extensions['migrate'].configure_args
         )
 